@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+ASGI-версия API (/api/check, /api/add, /api/list) с тем же контрактом, что и server.py
+
+Точная проверка никнейма отвечает из индекса в памяти прямо в цикле событий:
+индекс загружается при старте и дальше сверяется с БД в фоновом потоке
+(Database.start_watchlist_refresh), поэтому проверка не трогает SQLite.
+Нечеткий поиск, запись и листинг выполняются в пуле потоков БД (AsyncDatabase).
+
+Запуск в несколько процессов:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+или API_ENGINE=asgi python server.py
+
+Метрики хранятся в памяти каждого процесса, поэтому в нескольких процессах
+общий /metrics отвечает 404 (запрос попал бы в случайный процесс), а каждый
+процесс отдает свои на отдельном порту из METRICS_API_PORT..+API_WORKERS-1.
+Эти порты перечисляются в Prometheus как отдельные цели, счетчики суммируются
+запросом sum(...).
+"""
+
+import logging
+import multiprocessing
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from config import config
+from database import adb, db
+import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.LOGGING['LEVEL'])
+
+
+def validate_api_key(request: Request) -> bool:
+    """Проверка API-ключа в заголовках запроса"""
+    api_key = request.headers.get('X-API-KEY')
+    if api_key not in config.API['KEYS']:
+        logger.warning(f"Неавторизованный доступ с ключом: {api_key}")
+        return False
+    return True
+
+
+async def read_json(request: Request):
+    """Тело запроса как JSON или None, если оно некорректно"""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def check_nickname(request: Request) -> JSONResponse:
+    """
+    Проверяет наличие никнейма в базе
+    Пример запроса: {"nickname": "test_user", "mode": "fuzzy"}
+    """
+    if not validate_api_key(request):
+        return JSONResponse({'error': 'Invalid API key'}, status_code=401)
+
+    data = await read_json(request)
+    if not isinstance(data, dict) or not isinstance(data.get('nickname'), str):
+        return JSONResponse({'error': 'Nickname is required'}, status_code=400)
+
+    nickname = data['nickname'].strip()
+    mode = data.get('mode', config.MATCHING['DEFAULT_MODE'])
+    if mode not in ('exact', 'fuzzy'):
+        return JSONResponse({'error': 'Mode must be exact or fuzzy'}, status_code=400)
+
+    try:
+        if mode == 'exact':
+            # Поиск по индексу в памяти, поэтому выполняется прямо в цикле событий
+            match = db.match_nickname(nickname, mode=mode)
+        else:
+            # Нечеткий поиск дороже и при первом запросе строит индекс
+            match = await adb.match_nickname(nickname, mode=mode)
+    except Exception as e:
+        logger.error(f"Ошибка при проверке: {str(e)}")
+        return JSONResponse({'error': 'Database error'}, status_code=500)
+
+    logger.debug(f"Проверка никнейма {nickname}: {'найден' if match else 'не найден'}")
+    response = {
+        'exists': match is not None,
+        'nickname': nickname,
+        'timestamp': datetime.now().isoformat()
+    }
+    if match is not None:
+        response['matched'] = match['nickname']
+        response['distance'] = match['distance']
+    return JSONResponse(response)
+
+
+async def add_nickname(request: Request) -> JSONResponse:
+    """
+    Добавляет новый никнейм в базу
+    Пример запроса: {"nickname": "new_user"}
+    """
+    if not validate_api_key(request):
+        return JSONResponse({'error': 'Invalid API key'}, status_code=401)
+
+    data = await read_json(request)
+    nickname = data.get('nickname') if isinstance(data, dict) else None
+    if not isinstance(nickname, str) or not nickname.strip():
+        return JSONResponse({'error': 'Nickname is required'}, status_code=400)
+
+    nickname = nickname.strip()
+    source = data.get('source')
+    if source is None:
+        source = 'manual'
+    elif not isinstance(source, str):
+        return JSONResponse({'error': 'Source must be a string'}, status_code=400)
+
+    if db.is_tracked(nickname):
+        logger.warning("Попытка добавить существующий никнейм")
+        return JSONResponse({'error': 'Nickname already exists'}, status_code=400)
+
+    try:
+        if not await adb.add_nickname(nickname, source=source):
+            return JSONResponse({'error': 'Database error'}, status_code=500)
+    except Exception as e:
+        logger.error(f"Ошибка при добавлении: {str(e)}")
+        return JSONResponse({'error': 'Database error'}, status_code=500)
+
+    return JSONResponse({
+        'status': 'success',
+        'nickname': nickname,
+        'source': source
+    }, status_code=201)
+
+
+async def list_nicknames(request: Request) -> JSONResponse:
+    """
+    Возвращает страницу никнеймов (новые первыми)
+    Параметры: ?cursor=<id>&limit=<n>&direction=next|prev, ?all=1 включает деактивированные
+    """
+    if not validate_api_key(request):
+        return JSONResponse({'error': 'Invalid API key'}, status_code=401)
+
+    params = request.query_params
+    active_only = params.get('all', '0') != '1'
+    direction = params.get('direction', 'next')
+    try:
+        cursor = int(params['cursor']) if params.get('cursor') else None
+        limit = int(params.get('limit', config.API['PAGE_SIZE']))
+    except ValueError:
+        return JSONResponse({'error': 'Invalid cursor or limit'}, status_code=400)
+    if direction not in ('next', 'prev'):
+        return JSONResponse({'error': 'Direction must be next or prev'}, status_code=400)
+    limit = max(1, min(limit, config.API['MAX_PAGE_SIZE']))
+
+    try:
+        page = await adb.get_nicknames_page(cursor, limit, active_only, direction)
+    except Exception as e:
+        logger.error(f"Ошибка при получении списка: {str(e)}")
+        return JSONResponse({'error': 'Database error'}, status_code=500)
+
+    return JSONResponse(page)
+
+
+def is_worker_process() -> bool:
+    """Приложение запущено одним из рабочих процессов uvicorn --workers N"""
+    return multiprocessing.parent_process() is not None
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Метрики в текстовом формате Prometheus (только в однопроцессном режиме)"""
+    if is_worker_process():
+        return JSONResponse(
+            {'error': 'Metrics are served per worker on METRICS_API_PORT'}, status_code=404
+        )
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+class RequestTimingMiddleware:
+    """Записывает длительность запроса в гистограмму http_request_seconds (как server.py)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Шаблон маршрута, а не сам путь: число рядов метрики не растет
+            endpoint = getattr(scope.get('route'), 'path', 'unknown')
+            metrics.REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                endpoint=endpoint,
+                status=status[0]
+            )
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    """
+    Переносит старую БД API-сервера (как server.py при запуске), загружает индекс
+    никнеймов до первого запроса и запускает его фоновую сверку.
+    Рабочий процесс uvicorn --workers N поднимает и свой порт метрик.
+    """
+    await adb.run(db.migrate_legacy_db)
+    await adb.run(db.start_watchlist_refresh)
+    metrics_server = None
+    if is_worker_process():
+        if not config.METRICS['API_PORT']:
+            logger.error("METRICS_API_PORT=0: метрики рабочих процессов ASGI не отдаются")
+        metrics_server = metrics.start_http_server(
+            config.METRICS['API_PORT'], attempts=config.API['WORKERS']
+        )
+    yield
+    if metrics_server is not None:
+        metrics_server.shutdown()
+
+
+app = Starlette(lifespan=lifespan, middleware=[Middleware(RequestTimingMiddleware)], routes=[
+    Route('/api/check', check_nickname, methods=['POST']),
+    Route('/api/add', add_nickname, methods=['POST']),
+    Route('/api/list', list_nicknames, methods=['GET']),
+    Route('/metrics', metrics_endpoint, methods=['GET']),
+])
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Нагрузочные и микро-бенчмарки горячих путей: проверка и добавление никнеймов
+
+Для каждого размера списка создается временная БД с синтетическими никнеймами,
+после чего измеряются:
+- прямые вызовы Database (check_nickname, check_nicknames, add_nickname);
+- открытие снимка никнеймов (snapshot.py), проверка и поиск по тексту через него;
+- смешанная нагрузка: потоки детектора проверяют, «бот» параллельно добавляет;
+- HTTP-эндпоинты /api/check и /api/add через локальный тестовый клиент.
+
+Результаты (p50/p99 в микросекундах, запросов в секунду) можно сохранить как
+эталон и сравнивать с ним последующие прогоны:
+    python benchmark.py --sizes 1000,100000 --save-baseline
+    python benchmark.py --sizes 1000,100000 --compare
+"""
+
+import argparse
+import json
+import random
+import string
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from config import config
+
+DEFAULT_BASELINE = Path(__file__).parent / 'benchmark_baseline.json'
+API_HEADERS = {'X-API-KEY': config.API['KEYS'][0] if config.API['KEYS'] else ''}
+
+
+def synthetic_nicknames(count: int, seed: int = 42) -> List[str]:
+    """Генерирует count уникальных никнеймов длиной 6-16 символов"""
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + '_'
+    names = set()
+    while len(names) < count:
+        names.add(''.join(rng.choices(alphabet, k=rng.randint(6, 16))))
+    return sorted(names)
+
+
+def summarize(latencies_ns: List[int], elapsed: float) -> Dict[str, float]:
+    """p50/p99 (мкс) и пропускная способность (оп/с)"""
+    ordered = sorted(latencies_ns)
+    count = len(ordered)
+    if not count:
+        return {'ops': 0, 'p50_us': 0.0, 'p99_us': 0.0, 'ops_per_sec': 0.0}
+    return {
+        'ops': count,
+        'p50_us': round(ordered[count // 2] / 1000, 2),
+        'p99_us': round(ordered[min(count - 1, int(count * 0.99))] / 1000, 2),
+        'ops_per_sec': round(count / elapsed, 1) if elapsed else 0.0
+    }
+
+
+def measure(operation: Callable[[int], None], iterations: int) -> Dict[str, float]:
+    """Последовательно выполняет operation(i) и собирает задержки"""
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        op_started = time.perf_counter_ns()
+        operation(i)
+        latencies.append(time.perf_counter_ns() - op_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def measure_mixed(db, names: List[str], readers: int, duration: float) -> Dict[str, Dict]:
+    """Потоки детектора проверяют никнеймы, пока поток бота добавляет новые"""
+    stop = threading.Event()
+    read_latencies: List[List[int]] = [[] for _ in range(readers)]
+    write_latencies: List[int] = []
+
+    def reader(slot: int) -> None:
+        rng = random.Random(slot)
+        latencies = read_latencies[slot]
+        while not stop.is_set():
+            # Половина запросов - попадания, половина - промахи
+            nickname = rng.choice(names) if rng.random() < 0.5 else f"miss_{rng.random()}"
+            op_started = time.perf_counter_ns()
+            db.check_nickname(nickname)
+            latencies.append(time.perf_counter_ns() - op_started)
+
+    def writer() -> None:
+        i = 0
+        while not stop.is_set():
+            op_started = time.perf_counter_ns()
+            db.add_nickname(f"bench_mixed_{i}", source='benchmark')
+            write_latencies.append(time.perf_counter_ns() - op_started)
+            i += 1
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=reader, args=(slot,)) for slot in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'mixed_check': summarize([x for chunk in read_latencies for x in chunk], elapsed),
+        'mixed_add': summarize(write_latencies, elapsed)
+    }
+
+
+def run_size(size: int, iterations: int, readers: int, duration: float) -> Dict[str, Dict]:
+    """Все сценарии для одного размера списка"""
+    from database import db
+    from snapshot import WatchlistSnapshot
+    import server
+
+    names = synthetic_nicknames(size)
+    started = time.perf_counter()
+    db.add_nicknames((name, 'benchmark') for name in names)
+    print(f"  заполнение {size}: {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+    rng = random.Random(size)
+    hits = [rng.choice(names) for _ in range(iterations)]
+    batch = [rng.choice(names) if i % 2 else f"miss_{i}" for i in range(50)]
+
+    results = {
+        'check_hit': measure(lambda i: db.check_nickname(hits[i]), iterations),
+        'check_miss': measure(lambda i: db.check_nickname(f"miss_{i}"), iterations),
+        'check_batch_50': measure(lambda i: db.check_nicknames(batch), max(1, iterations // 50)),
+        'add': measure(lambda i: db.add_nickname(f"bench_add_{size}_{i}", 'benchmark'),
+                       max(1, iterations // 10)),
+    }
+    results.update(measure_mixed(db, names, readers, duration))
+
+    snapshot_path = db.export_snapshot()['path']
+    results['snapshot_load'] = measure(lambda i: WatchlistSnapshot(snapshot_path).close(),
+                                       max(1, iterations // 100))
+    snapshot = WatchlistSnapshot(snapshot_path)
+    results['snapshot_check'] = measure(lambda i: hits[i] in snapshot, iterations)
+    # Текст кадра: 20 строк чата, в каждой десятой - отслеживаемый никнейм
+    scans = max(1, iterations // 10)
+    texts = [
+        '\n'.join(f"{hits[(i + line) % iterations] if line % 10 == 0 else f'player_{line}'}: hello"
+                  for line in range(20))
+        for i in range(scans)
+    ]
+    results['snapshot_scan'] = measure(lambda i: snapshot.scan(texts[i]), scans)
+    snapshot.close()
+
+    client = server.app.test_client()
+    results['http_check'] = measure(
+        lambda i: client.post('/api/check', json={'nickname': hits[i]}, headers=API_HEADERS),
+        iterations
+    )
+    results['http_add'] = measure(
+        lambda i: client.post('/api/add', json={'nickname': f"bench_http_{size}_{i}"},
+                              headers=API_HEADERS),
+        max(1, iterations // 10)
+    )
+
+    db.flush_detections()
+    return results
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Возвращает список регрессий относительно эталона"""
+    regressions = []
+    for size, scenarios in results.items():
+        for name, current in scenarios.items():
+            reference = baseline.get(size, {}).get(name)
+            if not reference:
+                continue
+            if reference['p99_us'] and current['p99_us'] > reference['p99_us'] * (1 + tolerance):
+                regressions.append(
+                    f"{size}/{name}: p99 {reference['p99_us']} -> {current['p99_us']} мкс"
+                )
+            if current['ops_per_sec'] < reference['ops_per_sec'] * (1 - tolerance):
+                regressions.append(
+                    f"{size}/{name}: {reference['ops_per_sec']} -> {current['ops_per_sec']} оп/с"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарки проверки и добавления никнеймов")
+    parser.add_argument('--sizes', default='1000,100000,1000000',
+                        help="Размеры списка никнеймов через запятую")
+    parser.add_argument('--iterations', type=int, default=10000, help="Операций на сценарий")
+    parser.add_argument('--readers', type=int, default=4, help="Потоков детектора в смешанной нагрузке")
+    parser.add_argument('--duration', type=float, default=3.0, help="Длительность смешанной нагрузки (с)")
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help="Файл эталонных результатов")
+    parser.add_argument('--save-baseline', action='store_true', help="Сохранить результаты как эталон")
+    parser.add_argument('--compare', action='store_true', help="Сравнить с эталоном")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Допустимое ухудшение (доля)")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Каждому размеру - отдельный процесс-независимый файл БД
+            config.DATABASE['PATH'] = str(Path(tmp) / 'bench.db')
+            config.DATABASE['LEGACY_PATH'] = str(Path(tmp) / 'legacy.db')
+            config.DATABASE['SNAPSHOT_PATH'] = str(Path(tmp) / 'watchlist.snap')
+            for module in ('server', 'asgi', 'importer', 'database'):
+                sys.modules.pop(module, None)
+            print(f"Размер списка: {size}", file=sys.stderr)
+            results[str(size)] = run_size(size, args.iterations, args.readers, args.duration)
+            sys.modules['database'].db.close()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"Эталон сохранен: {baseline_path}", file=sys.stderr)
+    if args.compare:
+        if not baseline_path.exists():
+            parser.error(f"Эталон не найден: {baseline_path}")
+        baseline = json.loads(baseline_path.read_text(encoding='utf-8'))
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"РЕГРЕССИЯ {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("Регрессий нет", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,20 @@
-from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes
-from database import db
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ContextTypes, MessageHandler, filters
+from database import adb
+from notifier import MAX_MESSAGE_LENGTH, NotificationDispatcher
+import metrics
+import importer
 from config import config
+import csv
+import io
 import logging
+import sqlite3
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+LIST_HEADER = "📋 Список никнеймов:\n"
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     await update.message.reply_text(
@@ -23,46 +31,222 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/add <никнейм> - Добавить никнейм\n"
         "/del <никнейм> - Удалить никнейм\n"
         "/list - Показать все никнеймы\n"
+        "/stats <никнейм> - Статистика обнаружений\n"
+        "Файл .csv или .ndjson - массовый импорт никнеймов (для администраторов)\n"
         "/help - Показать это сообщение"
     )
     await update.message.reply_text(help_text)
 
 async def add_nick(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    metrics.BOT_COMMANDS.inc(command="add")
     if not context.args:
         await update.message.reply_text("Укажите никнейм: /add <никнейм>")
         return
 
     nickname = " ".join(context.args)
-    if db.add_nickname(nickname, source="telegram"):
+    if await adb.add_nickname(nickname, source="telegram"):
         await update.message.reply_text(f"✅ Добавлен: {nickname}")
     else:
         await update.message.reply_text(f"⚠ Ошибка: никнейм уже существует")
 
 async def del_nick(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    metrics.BOT_COMMANDS.inc(command="del")
     if not context.args:
         await update.message.reply_text("Укажите никнейм: /del <никнейм>")
         return
 
     nickname = " ".join(context.args)
-    if db.remove_nickname(nickname):
+    if await adb.remove_nickname(nickname):
         await update.message.reply_text(f"🗑 Удален: {nickname}")
     else:
         await update.message.reply_text(f"⚠ Ошибка: никнейм не найден")
 
+async def stats_nick(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    metrics.BOT_COMMANDS.inc(command="stats")
+    if not context.args:
+        await update.message.reply_text("Укажите никнейм: /stats <никнейм>")
+        return
+
+    nickname = " ".join(context.args)
+    stats = await adb.get_detection_stats(nickname, config.TELEGRAM['STATS_DAYS'])
+    if not stats['total'] and not stats['last_24h']:
+        await update.message.reply_text(
+            f"📊 {nickname}: не обнаружен за {stats['days']} дн."
+        )
+        return
+
+    lines = [
+        f"📊 Статистика: {nickname}",
+        f"За 24 ч: {stats['last_24h']}",
+        f"За {stats['days']} дн.: {stats['total']}",
+        f"Последнее обнаружение: {stats['last_seen']}"
+    ]
+    if stats['by_source']:
+        lines.append("Источники:")
+        lines.extend(
+            f"• {source or 'неизвестен'}: {count}"
+            for source, count in sorted(stats['by_source'].items(), key=lambda item: -item[1])
+        )
+    await update.message.reply_text("\n".join(lines))
+
+def fit_list_page(page, direction="next", header=LIST_HEADER, limit=MAX_MESSAGE_LENGTH):
+    """
+    Укорачивает страницу списка, чтобы ее текст уложился в одно сообщение.
+    Остаются никнеймы, ближайшие к курсору, курсор с другой стороны
+    переносится на последний оставшийся. Никнейм длиннее самого сообщения
+    обрезается только при выводе. Возвращает (текст, страница).
+    """
+    rows = page['nicknames']
+    line_limit = limit - len(header)
+    # Для 'prev' ближе к курсору последние строки страницы
+    ordered = rows if direction == "next" else rows[::-1]
+    kept, length = [], len(header)
+    for row in ordered:
+        line = row['nickname'] if len(row['nickname']) < line_limit else row['nickname'][:line_limit - 2] + "…"
+        if kept and length + len(line) + 1 > limit:
+            break
+        kept.append((row, line))
+        length += len(line) + 1
+
+    if len(kept) < len(rows):
+        page = dict(page)
+        if direction == "next":
+            page['next_cursor'] = kept[-1][0]['id']
+        else:
+            kept.reverse()
+            page['prev_cursor'] = kept[0][0]['id']
+        page['nicknames'] = [row for row, _ in kept]
+    elif direction != "next":
+        kept.reverse()
+    return header + "\n".join(line for _, line in kept), page
+
+async def render_list_page(cursor=None, direction="next"):
+    """Формирует текст и кнопки навигации для страницы списка никнеймов"""
+    page = await adb.get_nicknames_page(cursor, config.TELEGRAM['LIST_PAGE_SIZE'], direction=direction)
+    if not page['nicknames']:
+        return "Список пуст", None
+
+    text, page = fit_list_page(page, direction)
+
+    buttons = []
+    if page['prev_cursor'] is not None:
+        buttons.append(InlineKeyboardButton("⬅ Назад", callback_data=f"list:prev:{page['prev_cursor']}"))
+    if page['next_cursor'] is not None:
+        buttons.append(InlineKeyboardButton("Вперед ➡", callback_data=f"list:next:{page['next_cursor']}"))
+    return text, InlineKeyboardMarkup([buttons]) if buttons else None
+
 async def list_nicks(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    nicks = db.get_all_nicknames()
-    response = "📋 Список никнеймов:\n" + "\n".join([n['nickname'] for n in nicks]) if nicks else "Список пуст"
-    await update.message.reply_text(response)
+    metrics.BOT_COMMANDS.inc(command="list")
+    text, markup = await render_list_page()
+    await update.message.reply_text(text, reply_markup=markup)
+
+async def list_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    metrics.BOT_COMMANDS.inc(command="list_page")
+    query = update.callback_query
+    await query.answer()
+
+    _, direction, cursor = query.data.split(":")
+    text, markup = await render_list_page(int(cursor), direction)
+    await query.edit_message_text(text, reply_markup=markup)
+
+async def import_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    metrics.BOT_COMMANDS.inc(command="import")
+    user = update.effective_user
+    if user is None or user.id not in config.TELEGRAM['ADMIN_IDS']:
+        logger.warning(f"Попытка импорта без прав: {user.id if user else None}")
+        await update.message.reply_text("⛔ Импорт доступен только администраторам")
+        return
+
+    document = update.message.document
+    fmt = importer.detect_format(document.file_name, default=None)
+    if fmt is None:
+        await update.message.reply_text("⚠ Поддерживаются только файлы .csv и .ndjson")
+        return
+
+    buffer = io.BytesIO()
+    telegram_file = await document.get_file()
+    await telegram_file.download_to_memory(buffer)
+    buffer.seek(0)
+
+    try:
+        counts = await adb.run(importer.import_bytes, buffer, fmt, source="telegram")
+    except UnicodeDecodeError:
+        await update.message.reply_text("⚠ Ошибка: файл должен быть в кодировке UTF-8")
+        return
+    except (csv.Error, sqlite3.Error) as e:
+        logger.error(f"Ошибка при импорте файла {document.file_name}: {str(e)}")
+        await update.message.reply_text(f"⚠ Ошибка импорта: {e}")
+        return
+
+    await update.message.reply_text(
+        f"📥 Импорт завершен\n"
+        f"Обработано: {counts['processed']}\n"
+        f"Добавлено: {counts['imported']}\n"
+        f"Пропущено: {counts['skipped']}\n"
+        f"Ошибок: {counts['failed']}"
+    )
+
+async def post_init(app: Application):
+    chat_id = config.TELEGRAM['NOTIFICATION_CHAT_ID']
+    if not chat_id:
+        logger.warning("NOTIFICATION_CHAT_ID не задан, уведомления отключены")
+        return
+
+    notifier = NotificationDispatcher(app.bot, chat_id)
+    notifier.start()
+    app.bot_data['notifier'] = notifier
+
+    if config.TELEGRAM['DETECTOR_ENABLED']:
+        # Импорт здесь: зависимости OCR нужны только при включенном мониторе
+        from screen_monitor import OcrPipeline, region_sources
+
+        sources = region_sources()
+        if not sources:
+            logger.warning("Не заданы области экрана OCR_REGIONS или OCR_SCREEN_REGION, монитор не запущен")
+            return
+
+        # Конструктор читает набор символов списка из БД (и может загрузить
+        # индекс), поэтому конвейер собирается в пуле потоков БД
+        pipeline = await adb.run(
+            OcrPipeline,
+            sources,
+            on_match=lambda match: notifier.notify(match['nickname'], match['source']),
+            # Бот сам меняет список, поэтому детектор работает с живым индексом БД
+            watchlist=adb.db
+        )
+        pipeline.start()
+        app.bot_data['pipeline'] = pipeline
+        logger.info(f"Монитор экрана запущен: {', '.join(source.name for source in sources)}")
+
+async def post_shutdown(app: Application):
+    pipeline = app.bot_data.get('pipeline')
+    if pipeline is not None:
+        pipeline.stop()
+
+    notifier = app.bot_data.get('notifier')
+    if notifier is not None:
+        await notifier.stop()
+
+    adb.close()
 
 def run_bot():
-    app = Application.builder().token(config.TELEGRAM['BOT_TOKEN']).build()
+    builder = Application.builder().token(config.TELEGRAM['BOT_TOKEN'])
+    if config.TELEGRAM['API_BASE_URL']:
+        builder = builder.base_url(config.TELEGRAM['API_BASE_URL'])
+    # Обработчики не блокируют друг друга: запросы к БД идут через adb
+    builder = builder.concurrent_updates(config.TELEGRAM['CONCURRENT_UPDATES'])
+    app = builder.post_init(post_init).post_shutdown(post_shutdown).build()
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("help", help_command))
     app.add_handler(CommandHandler("add", add_nick))
     app.add_handler(CommandHandler("del", del_nick))  # Добавлен обработчик удаления
     app.add_handler(CommandHandler("list", list_nicks))
+    app.add_handler(CommandHandler("stats", stats_nick))
+    app.add_handler(CallbackQueryHandler(list_page, pattern=r"^list:(next|prev):\d+$"))
+    app.add_handler(MessageHandler(filters.Document.ALL, import_document))
 
+    metrics.start_http_server(config.METRICS['BOT_PORT'])
     logger.info("Бот запущен")
     app.run_polling()
 
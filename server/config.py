@@ -17,8 +17,43 @@ class Config:
         'PATH': str(Path(__file__).parent / 'data' / 'nicknames.db'),
         'URL': os.getenv('DATABASE_URL', f'sqlite:///{Path(__file__).parent}/data/nicknames.db'),
         'TABLE_NAME': 'tracked_nicknames',
+        # Счетчик изменений списка никнеймов (увеличивается триггерами TABLE_NAME)
+        'WATCHLIST_VERSION_TABLE': 'watchlist_version',
+        # История обнаружений: события и почасовые/посуточные сводки
+        'DETECTIONS_TABLE': 'detections',
+        'ROLLUPS_TABLE': 'detection_rollups',
+        # Старая БД API-сервера (таблица nicknames) для однократной миграции
+        'LEGACY_PATH': str(Path(__file__).parent / 'nicknames.db'),
         'BACKUP_DIR': str(Path(__file__).parent / 'backups'),
-        'BACKUP_DAYS': 7
+        'BACKUP_DAYS': 7,
+        # Как часто (сек) сверять версию списка никнеймов для обновления индекса
+        'WATCHLIST_REFRESH_INTERVAL': float(os.getenv('DATABASE_WATCHLIST_REFRESH_INTERVAL', 1.0)),
+        # Отложенная запись last_detected: интервал сброса (сек) и размер буфера
+        'DETECTION_FLUSH_INTERVAL': float(os.getenv('DATABASE_DETECTION_FLUSH_INTERVAL', 5.0)),
+        'DETECTION_FLUSH_SIZE': int(os.getenv('DATABASE_DETECTION_FLUSH_SIZE', 500)),
+        # Минимальная пауза (сек) между сбросами при переполненном буфере
+        'DETECTION_FLUSH_MIN_GAP': float(os.getenv('DATABASE_DETECTION_FLUSH_MIN_GAP', 0.1)),
+        # Хранение истории (дней): события и почасовые сводки; посуточные хранятся всегда.
+        # Устаревшие записи удаляются не чаще раза в DETECTION_PRUNE_INTERVAL секунд
+        'DETECTION_RETENTION_DAYS': int(os.getenv('DATABASE_DETECTION_RETENTION_DAYS', 7)),
+        'HOURLY_ROLLUP_RETENTION_DAYS': int(os.getenv('DATABASE_HOURLY_ROLLUP_RETENTION_DAYS', 90)),
+        'DETECTION_PRUNE_INTERVAL': 3600,
+        # Размер порции (одна транзакция) при массовом импорте
+        'IMPORT_CHUNK_SIZE': int(os.getenv('DATABASE_IMPORT_CHUNK_SIZE', 5000)),
+        # Снимок активных никнеймов для детекторов (пустая строка - не писать)
+        'SNAPSHOT_PATH': os.getenv('DATABASE_SNAPSHOT_PATH',
+                                   str(Path(__file__).parent / 'data' / 'watchlist.snap')),
+        # Пул соединений: максимум соединений и ожидание свободного (сек)
+        'POOL_SIZE': int(os.getenv('DATABASE_POOL_SIZE', 8)),
+        'POOL_TIMEOUT': float(os.getenv('DATABASE_POOL_TIMEOUT', 10.0)),
+        # PRAGMA, применяемые к каждому новому соединению
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -16000
+        }
     }
 
     # 2. Настройки API сервера
@@ -27,7 +62,19 @@ class Config:
         'PORT': int(os.getenv('API_PORT', 5000)),
         'DEBUG': os.getenv('API_DEBUG', 'false').lower() == 'true',
         'SECRET_KEY': os.getenv('API_SECRET_KEY', 'default-secret-key'),
-        'RATE_LIMIT': os.getenv('API_RATE_LIMIT', '100/day')
+        'RATE_LIMIT': os.getenv('API_RATE_LIMIT', '100/day'),
+        # Ключи клиентов (заголовок X-API-KEY), через запятую
+        'KEYS': [x for x in os.getenv('API_KEYS', 'your-secret-key').split(',') if x],
+        # Движок сервера: flask (встроенный сервер) или asgi (uvicorn, asgi.py)
+        'ENGINE': os.getenv('API_ENGINE', 'flask'),
+        'WORKERS': int(os.getenv('API_WORKERS', os.cpu_count() or 1)),
+        'MAX_BATCH_SIZE': int(os.getenv('API_MAX_BATCH_SIZE', 500)),
+        'MAX_SCAN_TEXT_LENGTH': int(os.getenv('API_MAX_SCAN_TEXT_LENGTH', 100000)),
+        # Размер страницы /api/list по умолчанию и максимальный
+        'PAGE_SIZE': 100,
+        'MAX_PAGE_SIZE': 1000,
+        # Максимальный период /api/stats (дней)
+        'MAX_STATS_DAYS': 366
     }
 
     # 3. Настройки Telegram бота
@@ -35,17 +82,89 @@ class Config:
         'BOT_TOKEN': os.getenv('TELEGRAM_BOT_TOKEN'),
         'ADMIN_IDS': [int(x) for x in os.getenv('TELEGRAM_ADMIN_IDS', '').split(',') if x],
         'NOTIFICATION_CHAT_ID': os.getenv('TELEGRAM_NOTIFICATION_CHAT_ID'),
-        'MAX_NICKNAME_LENGTH': 25
+        'MAX_NICKNAME_LENGTH': 25,
+        # Никнеймов на одной странице /list (страница еще и укорачивается,
+        # чтобы уложиться в лимит длины сообщения)
+        'LIST_PAGE_SIZE': 50,
+        # За сколько дней /stats показывает историю обнаружений
+        'STATS_DAYS': int(os.getenv('TELEGRAM_STATS_DAYS', 7)),
+        # Сколько обновлений бот обрабатывает одновременно
+        'CONCURRENT_UPDATES': int(os.getenv('TELEGRAM_CONCURRENT_UPDATES', 16)),
+        # Адрес Bot API (можно указать локальный сервер для тестов)
+        'API_BASE_URL': os.getenv('TELEGRAM_API_BASE_URL'),
+        # Уведомления: пауза между повторами одного ника (сек), окно сводки (сек),
+        # лимит сообщений в секунду и размер очереди
+        'NOTIFICATION_COOLDOWN': float(os.getenv('TELEGRAM_NOTIFICATION_COOLDOWN', 300)),
+        'NOTIFICATION_DIGEST_WINDOW': float(os.getenv('TELEGRAM_NOTIFICATION_DIGEST_WINDOW', 5)),
+        'NOTIFICATION_RATE_LIMIT': float(os.getenv('TELEGRAM_NOTIFICATION_RATE_LIMIT', 1)),
+        'NOTIFICATION_QUEUE_SIZE': 1000,
+        # Запускать монитор экрана внутри процесса бота
+        'DETECTOR_ENABLED': os.getenv('TELEGRAM_DETECTOR_ENABLED', 'false').lower() == 'true'
     }
 
     # 4. Настройки OCR
     OCR = {
         'SCREEN_REGION': tuple(map(int, os.getenv('OCR_SCREEN_REGION', '100,100,300,200').split(','))) if os.getenv('OCR_SCREEN_REGION') else None,
+        # Несколько именованных областей (JSON); если задано, SCREEN_REGION не используется.
+        # Для каждой области можно переопределить interval, lang, psm и preprocess:
+        # {"chat": {"region": [0, 600, 400, 300], "interval": 0.5},
+        #  "game": {"region": [800, 0, 300, 80], "psm": 6, "preprocess": false}}
+        # Строка разбирается монитором (screen_monitor.parse_regions): ошибка в ней
+        # не должна ронять при импорте конфига бота и API
+        'REGIONS': os.getenv('OCR_REGIONS', ''),
         'LANG': os.getenv('OCR_LANG', 'rus+eng'),
-        'TESSERACT_PATH': os.getenv('TESSERACT_PATH', '/usr/bin/tesseract')
+        'TESSERACT_PATH': os.getenv('TESSERACT_PATH', '/usr/bin/tesseract'),
+        # Период захвата экрана (сек)
+        'INTERVAL': float(os.getenv('OCR_INTERVAL', 1.0)),
+        # Перцептивный хэш кадра: размер стороны и допустимое число различающихся бит
+        'HASH_SIZE': 16,
+        'HASH_THRESHOLD': int(os.getenv('OCR_HASH_THRESHOLD', 0)),
+        # Минимальный перепад яркости в ряду пикселей, чтобы считать его строкой текста
+        'INK_THRESHOLD': 40,
+        # Число строк в LRU-кэше результатов OCR
+        'CACHE_SIZE': int(os.getenv('OCR_CACHE_SIZE', 512)),
+        # Пул процессов OCR и длина очереди кадров (старые кадры выбрасываются)
+        'WORKERS': int(os.getenv('OCR_WORKERS', os.cpu_count() or 1)),
+        'QUEUE_SIZE': int(os.getenv('OCR_QUEUE_SIZE', 2)),
+        # Сколько кадров одновременно распознается в пуле (0 - вдвое больше WORKERS)
+        'MAX_IN_FLIGHT': int(os.getenv('OCR_MAX_IN_FLIGHT', 0)),
+        # Предобработка строки перед OCR: бинаризация, обрезка, масштаб
+        'PREPROCESS': os.getenv('OCR_PREPROCESS', 'true').lower() == 'true',
+        'TARGET_GLYPH_HEIGHT': 32,
+        'THRESHOLD_RADIUS': 8,
+        'THRESHOLD_OFFSET': 10,
+        # Режим сегментации Tesseract: 7 - одна строка текста
+        'PSM': 7,
+        # Белый список символов из отслеживаемых никнеймов плюс разделители
+        'USE_WHITELIST': os.getenv('OCR_USE_WHITELIST', 'true').lower() == 'true',
+        'WHITELIST_EXTRA': ':,.-_'
     }
 
-    # 5. Логирование
+    # 5. Нечеткое сопоставление никнеймов
+    MATCHING = {
+        # Режим по умолчанию для /api/check: exact или fuzzy
+        'DEFAULT_MODE': os.getenv('MATCHING_DEFAULT_MODE', 'exact'),
+        # Максимум правок (Дамерау-Левенштейн) после нормализации
+        'MAX_DISTANCE': int(os.getenv('MATCHING_MAX_DISTANCE', 1)),
+        # На каждую допустимую правку никнейм должен иметь столько символов
+        'MIN_LENGTH_PER_EDIT': 4,
+        # Поиск никнеймов в тексте кадра (/api/scan)
+        'SCAN_IGNORE_CASE': os.getenv('MATCHING_SCAN_IGNORE_CASE', 'false').lower() == 'true',
+        'SCAN_WHOLE_WORDS': True
+    }
+
+    # 6. Метрики Prometheus
+    METRICS = {
+        # Порты /metrics для процессов без веб-сервера (0 - не запускать)
+        'BOT_PORT': int(os.getenv('METRICS_BOT_PORT', 0)),
+        'MONITOR_PORT': int(os.getenv('METRICS_MONITOR_PORT', 0)),
+        # Первый порт /metrics рабочих процессов ASGI (uvicorn --workers N): каждый
+        # процесс занимает свободный из API_PORT..API_PORT + API_WORKERS - 1
+        # (0 - не отдавать, общий /metrics в этом режиме все равно отвечает 404)
+        'API_PORT': int(os.getenv('METRICS_API_PORT', 9400))
+    }
+
+    # 7. Логирование
     LOGGING = {
         'LEVEL': os.getenv('LOG_LEVEL', 'INFO'),
         'FORMAT': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
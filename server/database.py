@@ -3,17 +3,117 @@
 Модуль для работы с базой данных Nickname Detector
 """
 
+import asyncio
+import atexit
+import queue
 import sqlite3
-from datetime import datetime
-from typing import List, Dict, Optional, Union
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Any, Callable, Iterable, Iterator, List, Dict, Optional, Set, Tuple, Union
 from pathlib import Path
 import logging
 from config import config
+import metrics
+from matcher import FuzzyMatcher
+from scanner import NicknameScanner
+from snapshot import write_snapshot
 
 # Настройка логгера
 logger = logging.getLogger(__name__)
 logger.setLevel(config.LOGGING['LEVEL'])
 
+# Формат времени обнаружений в БД (UTC, как CURRENT_TIMESTAMP в SQLite)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Локальное изменение индекса: (добавление?, никнеймы, версии списка до и после)
+IndexChange = Tuple[bool, List[str], Optional[Tuple[int, int]]]
+
+
+class ConnectionPool:
+    """Пул переиспользуемых соединений SQLite с учетом потоков"""
+
+    def __init__(self, db_path: Union[str, Path], max_size: int = None,
+                 timeout: float = None, pragmas: Dict = None):
+        self.db_path = Path(db_path)
+        self.max_size = max_size or config.DATABASE['POOL_SIZE']
+        self.timeout = timeout if timeout is not None else config.DATABASE['POOL_TIMEOUT']
+        self.pragmas = pragmas if pragmas is not None else config.DATABASE['PRAGMAS']
+
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        # Соединение, выданное текущему потоку (для вложенных вызовов)
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открывает соединение и один раз применяет к нему PRAGMA"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # Включаем поддержку внешних ключей
+        conn.execute("PRAGMA foreign_keys = ON")
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        """Берет свободное соединение или создает новое в пределах max_size"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except sqlite3.Error:
+                    self._created -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"Нет свободных соединений в пуле ({self.max_size})"
+            )
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Выдает соединение потоку и возвращает его в пул по завершении"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            # Вложенный вызов в том же потоке использует то же соединение
+            yield conn
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        """Закрывает все свободные соединения пула"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
 
 class Database:
     """Класс для работы с базой данных SQLite"""
@@ -21,8 +121,49 @@ class Database:
     def __init__(self):
         self.db_path = Path(config.DATABASE['PATH'])
         self._ensure_db_directory()
+        self._pool = ConnectionPool(self.db_path)
         self._init_db()
 
+        # Индекс активных никнеймов в памяти: проверка без обращения к SQLite
+        self._watchlist: Set[str] = set()
+        self._watchlist_lock = threading.Lock()
+        self._watchlist_checked_at = 0.0
+        # Версия списка в БД, которой соответствует индекс (см. _init_watchlist_version)
+        self._data_version: Optional[int] = None
+        # Индексы собираются без _watchlist_lock; локальные изменения за время
+        # сборки копятся в журнале и доигрываются перед подменой
+        self._build_lock = threading.Lock()
+        self._index_builds = 0
+        self._index_changes: List[IndexChange] = []
+        self._watchlist_generation = 0
+        # Растет при каждом изменении индекса (см. watchlist_version)
+        self._index_version = 0
+        # Фоновая сверка индекса с БД (start_watchlist_refresh)
+        self._refresh_thread: Optional[threading.Thread] = None
+        # Индекс нечеткого поиска строится при первом запросе в режиме fuzzy
+        self._fuzzy: Optional[FuzzyMatcher] = None
+        # Автомат Ахо-Корасик для поиска по тексту кадра, строится при первом запросе
+        self._scanner: Optional[NicknameScanner] = None
+        # Сам индекс загружается при первом обращении (_refresh_watchlist_if_stale)
+        metrics.WATCHLIST_SIZE.set_function(lambda: len(self._watchlist))
+
+        # Буфер отложенной записи last_detected: nickname -> (время, источник)
+        self._pending_detections: Dict[str, Tuple[str, Optional[str]]] = {}
+        # События для истории: (nickname, источник, начало минуты) -> [число, первое, последнее]
+        self._pending_events: Dict[Tuple[str, Optional[str], str], List] = {}
+        self._pending_lock = threading.Lock()
+        self._pruned_at = 0.0
+        # Снимок для детекторов перезаписывается отдельным фоновым потоком после
+        # изменений: сборка автомата занимает секунды и не должна задерживать сброс
+        self._snapshot_dirty = False
+        self._snapshot_written_at = 0.0
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._flush_stop = threading.Event()
+        # Будит поток сброса раньше срока, когда буфер заполнен
+        self._flush_wakeup = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+        atexit.register(self.close)
+
     def _ensure_db_directory(self) -> None:
         """Создает директорию для БД, если не существует"""
         try:
@@ -31,14 +172,10 @@ class Database:
             logger.critical(f"Не удалось создать директорию для БД: {str(e)}")
             raise
 
-    def _get_connection(self) -> sqlite3.Connection:
-        """Создает и возвращает соединение с базой данных"""
+    def _get_connection(self):
+        """Возвращает соединение из пула (используется как контекстный менеджер)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            # Включаем поддержку внешних ключей
-            conn.execute("PRAGMA foreign_keys = ON")
-            return conn
+            return self._pool.connection()
         except sqlite3.Error as e:
             logger.critical(f"Ошибка подключения к БД: {str(e)}")
             raise
@@ -64,6 +201,7 @@ class Database:
                             source TEXT DEFAULT 'manual',
                             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                             last_detected TIMESTAMP NULL,
+                            last_detected_source TEXT NULL,
                             is_active BOOLEAN DEFAULT 1
                         )
                     """)
@@ -72,10 +210,329 @@ class Database:
                         ON {config.DATABASE['TABLE_NAME']}(nickname, is_active)
                     """)
                     conn.commit()
+
+                # Источник последнего обнаружения (область экрана) появился позже
+                columns = {
+                    row['name'] for row in
+                    cursor.execute(f"PRAGMA table_info({config.DATABASE['TABLE_NAME']})")
+                }
+                if 'last_detected_source' not in columns:
+                    logger.info("Добавляем колонку last_detected_source")
+                    cursor.execute(f"""
+                        ALTER TABLE {config.DATABASE['TABLE_NAME']} 
+                        ADD COLUMN last_detected_source TEXT NULL
+                    """)
+                    conn.commit()
+
+                self._init_watchlist_version(cursor)
+                self._init_history_tables(cursor)
+                conn.commit()
         except sqlite3.Error as e:
             logger.critical(f"Ошибка инициализации БД: {str(e)}")
             raise
 
+    def _init_watchlist_version(self, cursor: sqlite3.Cursor) -> None:
+        """
+        Версия списка никнеймов: счетчик, который триггеры увеличивают только
+        при изменении набора активных никнеймов. Запись last_detected, истории
+        и сводок его не трогает, поэтому индекс не перезагружается после сброса
+        обнаружений.
+        """
+        table = config.DATABASE['TABLE_NAME']
+        versions = config.DATABASE['WATCHLIST_VERSION_TABLE']
+        bump = f"UPDATE {versions} SET version = version + 1 WHERE id = 1;"
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {versions} (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+        """)
+        cursor.execute(f"INSERT OR IGNORE INTO {versions} (id, version) VALUES (1, 0)")
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_version_insert 
+            AFTER INSERT ON {table} WHEN NEW.is_active = 1 
+            BEGIN {bump} END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_version_delete 
+            AFTER DELETE ON {table} WHEN OLD.is_active = 1 
+            BEGIN {bump} END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_version_update 
+            AFTER UPDATE OF is_active, nickname ON {table} 
+            WHEN OLD.is_active IS NOT NEW.is_active 
+                OR (NEW.is_active = 1 AND OLD.nickname IS NOT NEW.nickname) 
+            BEGIN {bump} END
+        """)
+
+    def _init_history_tables(self, cursor: sqlite3.Cursor) -> None:
+        """
+        История обнаружений: события (одна строка на никнейм, источник и минуту,
+        detected_at - начало минуты) и сводки по часам и суткам, из которых
+        отвечает статистика
+        """
+        detections = config.DATABASE['DETECTIONS_TABLE']
+        rollups = config.DATABASE['ROLLUPS_TABLE']
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {detections} (
+                id INTEGER PRIMARY KEY,
+                nickname TEXT NOT NULL,
+                source TEXT NULL,
+                detected_at TIMESTAMP NOT NULL,
+                count INTEGER NOT NULL DEFAULT 1,
+                first_seen TIMESTAMP NULL,
+                last_seen TIMESTAMP NULL
+            )
+        """)
+        # Раньше события писались по секундам без first_seen/last_seen
+        columns = {row['name'] for row in cursor.execute(f"PRAGMA table_info({detections})")}
+        if 'last_seen' not in columns:
+            logger.info("Добавляем колонки first_seen и last_seen в историю обнаружений")
+            cursor.execute(f"ALTER TABLE {detections} ADD COLUMN first_seen TIMESTAMP NULL")
+            cursor.execute(f"ALTER TABLE {detections} ADD COLUMN last_seen TIMESTAMP NULL")
+            cursor.execute(f"""
+                UPDATE {detections} SET first_seen = detected_at, last_seen = detected_at
+            """)
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_{detections}_nickname_time 
+            ON {detections}(nickname, detected_at)
+        """)
+        # Очистка по сроку хранения идет по этому индексу
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_{detections}_time 
+            ON {detections}(detected_at)
+        """)
+        # bucket: 'hour' или 'day'; source '' - источник неизвестен
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {rollups} (
+                nickname TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                bucket_start TIMESTAMP NOT NULL,
+                source TEXT NOT NULL DEFAULT '',
+                count INTEGER NOT NULL,
+                first_seen TIMESTAMP NOT NULL,
+                last_seen TIMESTAMP NOT NULL,
+                PRIMARY KEY (nickname, bucket, bucket_start, source)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_{rollups}_bucket 
+            ON {rollups}(bucket, bucket_start)
+        """)
+
+    def _read_watchlist_version(self, conn: sqlite3.Connection) -> int:
+        """Текущая версия списка никнеймов в БД"""
+        return conn.execute(
+            f"SELECT version FROM {config.DATABASE['WATCHLIST_VERSION_TABLE']} WHERE id = 1"
+        ).fetchone()[0]
+
+    @contextmanager
+    def _watchlist_write(self) -> Iterator[Tuple[sqlite3.Connection, List[int]]]:
+        """
+        Транзакция записи в список никнеймов. Версия читается до и после записи
+        под блокировкой записи, поэтому свои изменения не принимаются за чужие
+        и не вызывают перезагрузку индекса. Выдает (conn, [до, после]).
+        """
+        with self._get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            versions = [self._read_watchlist_version(conn)]
+            yield conn, versions
+            versions.append(self._read_watchlist_version(conn))
+            conn.commit()
+
+    def _apply_version(self, versions: Optional[Tuple[int, int]]) -> None:
+        """Переводит индекс на версию после своей записи (вызывается под _watchlist_lock)"""
+        if versions is not None and self._data_version == versions[0]:
+            self._data_version = versions[1]
+
+    def _track_changes(self) -> int:
+        """Начинает сборку индекса без блокировки (под _watchlist_lock)"""
+        self._index_builds += 1
+        return len(self._index_changes)
+
+    def _untrack_changes(self, start: int) -> List[IndexChange]:
+        """Заканчивает сборку и возвращает изменения за ее время (под _watchlist_lock)"""
+        changes = self._index_changes[start:]
+        self._index_builds -= 1
+        if not self._index_builds:
+            self._index_changes = []
+        return changes
+
+    @staticmethod
+    def _replay(changes: List[IndexChange], *indexes) -> None:
+        """Доигрывает изменения на только что собранных индексах"""
+        for added, nicknames, _ in changes:
+            for index in indexes:
+                if index is None:
+                    continue
+                if isinstance(index, set):
+                    if added:
+                        index.update(nicknames)
+                    else:
+                        index.difference_update(nicknames)
+                    continue
+                for nickname in nicknames:
+                    if added:
+                        index.add(nickname)
+                    else:
+                        index.remove(nickname)
+
+    @metrics.DB_QUERY_SECONDS.timed(operation='load_watchlist')
+    def _load_watchlist(self) -> None:
+        """
+        Загружает активные никнеймы и заново строит индексы. Сборка идет без
+        _watchlist_lock: до подмены проверки отвечают по прежнему индексу.
+        """
+        with self._build_lock:
+            # Изменения отслеживаются до чтения списка: запись, закоммиченная
+            # после снимка БД, иначе потерялась бы при подмене индекса
+            with self._watchlist_lock:
+                start = self._track_changes()
+                with_fuzzy = self._fuzzy is not None
+                with_scanner = self._scanner is not None
+            try:
+                try:
+                    with self._get_connection() as conn:
+                        # Версия и список читаются из одного снимка БД
+                        conn.execute("BEGIN")
+                        version = self._read_watchlist_version(conn)
+                        if version == self._data_version:
+                            return
+                        rows = conn.execute(
+                            f"""
+                            SELECT nickname FROM {config.DATABASE['TABLE_NAME']}
+                            WHERE is_active = 1
+                            """
+                        ).fetchall()
+                except sqlite3.Error as e:
+                    logger.error(f"Ошибка загрузки индекса никнеймов: {str(e)}")
+                    return
+
+                watchlist = {row['nickname'] for row in rows}
+                fuzzy = FuzzyMatcher(watchlist) if with_fuzzy else None
+                scanner = NicknameScanner(watchlist) if with_scanner else None
+            finally:
+                with self._watchlist_lock:
+                    changes = self._untrack_changes(start)
+
+            # Изменения, которые уже попали в снимок, не доигрываются: поверх них
+            # могла лечь запись другого процесса
+            changes = [
+                change for change in changes
+                if change[2] is None or change[2][1] > version
+            ]
+            with self._watchlist_lock:
+                self._replay(changes, watchlist, fuzzy, scanner)
+                self._watchlist, self._fuzzy, self._scanner = watchlist, fuzzy, scanner
+                self._watchlist_generation += 1
+                self._index_version += 1
+                self._data_version = version
+                for _, _, versions in changes:
+                    self._apply_version(versions)
+                self._watchlist_checked_at = time.monotonic()
+        logger.debug(f"Индекс никнеймов загружен: {len(watchlist)}")
+
+    def _get_index(self, name: str, factory: Callable[[Set[str]], Any]) -> Any:
+        """
+        Возвращает индекс _fuzzy или _scanner, при первом запросе строит его
+        по текущему списку без _watchlist_lock
+        """
+        index = getattr(self, name)
+        if index is not None:
+            return index
+
+        with self._build_lock:
+            while getattr(self, name) is None:
+                with self._watchlist_lock:
+                    nicknames = set(self._watchlist)
+                    generation = self._watchlist_generation
+                    start = self._track_changes()
+                try:
+                    index = factory(nicknames)
+                finally:
+                    with self._watchlist_lock:
+                        changes = self._untrack_changes(start)
+                with self._watchlist_lock:
+                    # Список перезагружен за время сборки: строим заново
+                    if generation == self._watchlist_generation:
+                        self._replay(changes, index)
+                        setattr(self, name, index)
+            return getattr(self, name)
+
+    def _refresh_watchlist_if_stale(self, force: bool = False) -> None:
+        """Перезагружает индекс, если список никнеймов изменил другой процесс"""
+        if not force and self._refresh_thread is not None:
+            # Индекс сверяет фоновый поток, проверки только читают его
+            return
+        now = time.monotonic()
+        if not force and now - self._watchlist_checked_at < config.DATABASE['WATCHLIST_REFRESH_INTERVAL']:
+            return
+        self._watchlist_checked_at = now
+
+        try:
+            with self._get_connection() as conn:
+                version = self._read_watchlist_version(conn)
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка проверки версии списка никнеймов: {str(e)}")
+            return
+
+        if version != self._data_version:
+            self._load_watchlist()
+
+    def start_watchlist_refresh(self) -> None:
+        """
+        Загружает индекс и дальше сверяет его с БД в фоновом потоке раз в
+        WATCHLIST_REFRESH_INTERVAL секунд. После этого is_tracked, check_nickname
+        и точный match_nickname не обращаются к SQLite (цикл событий asgi.py).
+        """
+        self._refresh_watchlist_if_stale(force=True)
+        with self._pending_lock:
+            if self._refresh_thread is not None:
+                return
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_loop,
+                name='watchlist-refresh',
+                daemon=True
+            )
+            self._refresh_thread.start()
+
+    def _refresh_loop(self) -> None:
+        """Фоновая сверка индекса с БД до закрытия"""
+        while not self._flush_stop.wait(config.DATABASE['WATCHLIST_REFRESH_INTERVAL']):
+            self._refresh_watchlist_if_stale(force=True)
+
+    def _index_add(self, nicknames: List[str], versions: Optional[Tuple[int, int]] = None) -> None:
+        """Добавляет никнеймы в индексы в памяти после своей записи в БД"""
+        with self._watchlist_lock:
+            self._watchlist.update(nicknames)
+            for nickname in nicknames:
+                if self._fuzzy is not None:
+                    self._fuzzy.add(nickname)
+                if self._scanner is not None:
+                    self._scanner.add(nickname)
+            self._apply_version(versions)
+            self._index_version += 1
+            if self._index_builds:
+                self._index_changes.append((True, list(nicknames), versions))
+        self._mark_snapshot_dirty()
+
+    def _index_remove(self, nicknames: List[str], versions: Optional[Tuple[int, int]] = None) -> None:
+        """Убирает никнеймы из индексов в памяти после своей записи в БД"""
+        with self._watchlist_lock:
+            for nickname in nicknames:
+                self._watchlist.discard(nickname)
+                if self._fuzzy is not None:
+                    self._fuzzy.remove(nickname)
+                if self._scanner is not None:
+                    self._scanner.remove(nickname)
+            self._apply_version(versions)
+            self._index_version += 1
+            if self._index_builds:
+                self._index_changes.append((False, list(nicknames), versions))
+        self._mark_snapshot_dirty()
+
+    @metrics.DB_QUERY_SECONDS.timed(operation='add_nickname')
     def add_nickname(self, nickname: str, source: str = 'manual') -> bool:
         """Добавляет никнейм в базу данных"""
         nickname = nickname.strip()
@@ -84,9 +541,8 @@ class Database:
             return False
 
         try:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
+            with self._watchlist_write() as (conn, versions):
+                conn.execute(
                     f"""
                     INSERT INTO {config.DATABASE['TABLE_NAME']} 
                     (nickname, source) VALUES (?, ?)
@@ -95,18 +551,73 @@ class Database:
                     """,
                     (nickname, source)
                 )
-                conn.commit()
-                logger.info(f"Добавлен/активирован никнейм: {nickname}")
-                return True
+            self._index_add([nickname], tuple(versions))
+            logger.info(f"Добавлен/активирован никнейм: {nickname}")
+            return True
         except sqlite3.Error as e:
             logger.error(f"Ошибка при добавлении никнейма {nickname}: {str(e)}")
             return False
 
+    @metrics.DB_QUERY_SECONDS.timed(operation='add_nicknames')
+    def add_nicknames(self, records: Iterable[Tuple[str, str]],
+                      chunk_size: int = None) -> Dict[str, int]:
+        """
+        Массово добавляет никнеймы из пар (nickname, source).
+        Запись идет порциями по chunk_size, каждая порция - одна транзакция
+        executemany с той же семантикой ON CONFLICT, что и add_nickname.
+        Возвращает счетчики {'processed', 'imported', 'skipped', 'failed'}.
+        """
+        chunk_size = chunk_size or config.DATABASE['IMPORT_CHUNK_SIZE']
+        counts = {'processed': 0, 'imported': 0, 'skipped': 0, 'failed': 0}
+        chunk: Dict[str, str] = {}
+
+        def flush() -> None:
+            try:
+                with self._watchlist_write() as (conn, versions):
+                    conn.executemany(
+                        f"""
+                        INSERT INTO {config.DATABASE['TABLE_NAME']} 
+                        (nickname, source) VALUES (?, ?)
+                        ON CONFLICT(nickname) 
+                        DO UPDATE SET is_active = 1, source = excluded.source
+                        """,
+                        list(chunk.items())
+                    )
+                self._index_add(list(chunk), tuple(versions))
+                counts['imported'] += len(chunk)
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка при массовом добавлении никнеймов: {str(e)}")
+                counts['failed'] += len(chunk)
+            chunk.clear()
+
+        for nickname, source in records:
+            counts['processed'] += 1
+            nickname = (nickname or '').strip()
+            if not nickname:
+                counts['skipped'] += 1
+                continue
+            if nickname in chunk:
+                # Повтор в той же порции: запишется одной строкой с последним источником
+                counts['skipped'] += 1
+            chunk[nickname] = source or 'manual'
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+
+        logger.info(
+            f"Импорт никнеймов: обработано {counts['processed']}, "
+            f"добавлено {counts['imported']}, пропущено {counts['skipped']}, "
+            f"ошибок {counts['failed']}"
+        )
+        return counts
+
+    @metrics.DB_QUERY_SECONDS.timed(operation='remove_nickname')
     def remove_nickname(self, nickname: str, soft_delete: bool = True) -> bool:
         """Удаляет или деактивирует никнейм"""
         nickname = nickname.strip()
         try:
-            with self._get_connection() as conn:
+            with self._watchlist_write() as (conn, versions):
                 cursor = conn.cursor()
 
                 if soft_delete:
@@ -129,81 +640,577 @@ class Database:
                         (nickname,)
                     )
 
-                conn.commit()
-                if cursor.rowcount > 0:
-                    logger.info(f"{'Деактивирован' if soft_delete else 'Удален'} никнейм: {nickname}")
-                    return True
+            self._index_remove([nickname], tuple(versions))
+            if cursor.rowcount > 0:
+                logger.info(f"{'Деактивирован' if soft_delete else 'Удален'} никнейм: {nickname}")
+                return True
 
-                logger.warning(f"Никнейм не найден или уже неактивен: {nickname}")
-                return False
+            logger.warning(f"Никнейм не найден или уже неактивен: {nickname}")
+            return False
         except sqlite3.Error as e:
             logger.error(f"Ошибка при удалении никнейма {nickname}: {str(e)}")
             return False
 
+    def is_tracked(self, nickname: str) -> bool:
+        """Проверяет, отслеживается ли никнейм, не отмечая обнаружение"""
+        self._refresh_watchlist_if_stale()
+        return nickname.strip() in self._watchlist
+
+    @property
+    def watchlist_version(self) -> int:
+        """Меняется при каждом изменении индекса никнеймов (для пересчета настроек OCR)"""
+        return self._index_version
+
+    def get_charset(self) -> Set[str]:
+        """Возвращает множество символов, встречающихся в активных никнеймах"""
+        self._refresh_watchlist_if_stale()
+        with self._watchlist_lock:
+            return set(''.join(self._watchlist))
+
     def check_nickname(self, nickname: str) -> bool:
-        """Проверяет наличие активного никнейма в базе"""
+        """Проверяет наличие активного никнейма по индексу в памяти"""
+        nickname = nickname.strip()
+        exists = self.is_tracked(nickname)
+        metrics.CHECKS.inc(result='hit' if exists else 'miss')
+
+        if exists:
+            self.record_detections([nickname])
+
+        return exists
+
+    def match_nickname(self, nickname: str, mode: str = 'exact') -> Optional[Dict]:
+        """
+        Ищет никнейм в режиме exact или fuzzy (с учетом ошибок OCR).
+        Возвращает {'nickname': <канонический никнейм>, 'distance': <число правок>}
+        или None, если совпадений нет.
+        """
         nickname = nickname.strip()
+        if self.is_tracked(nickname):
+            match = {'nickname': nickname, 'distance': 0}
+        elif mode == 'fuzzy':
+            fuzzy = self._get_index('_fuzzy', FuzzyMatcher)
+            with self._watchlist_lock:
+                match = fuzzy.match(nickname)
+        elif mode == 'exact':
+            match = None
+        else:
+            raise ValueError(f"Неизвестный режим сопоставления: {mode}")
+
+        metrics.CHECKS.inc(result='hit' if match else 'miss')
+        if match:
+            self.record_detections([match['nickname']])
+        return match
+
+    def scan_text(self, text: str, source: Optional[str] = None) -> List[Dict]:
+        """
+        Находит все отслеживаемые никнеймы в тексте кадра за один проход.
+        Возвращает список {'nickname', 'start', 'end'}.
+        source - откуда текст (имя области экрана), пишется в last_detected_source.
+        """
+        self._refresh_watchlist_if_stale()
+        scanner = self._get_index('_scanner', NicknameScanner)
+
+        matches = scanner.scan(text)
+        if matches:
+            self.record_detections(list({m['nickname'] for m in matches}), source)
+        return matches
+
+    def check_nicknames(self, nicknames: List[str]) -> Dict[str, bool]:
+        """Проверяет пачку никнеймов за один проход по индексу"""
+        self._refresh_watchlist_if_stale()
+        watchlist = self._watchlist
+        results = {}
+        for nickname in nicknames:
+            nickname = nickname.strip()
+            if nickname:
+                results[nickname] = nickname in watchlist
+
+        found = [nickname for nickname, exists in results.items() if exists]
+        metrics.CHECKS.inc(len(found), result='hit')
+        metrics.CHECKS.inc(len(results) - len(found), result='miss')
+        if found:
+            self.record_detections(found)
+
+        return results
+
+    def record_detections(self, nicknames: List[str], source: Optional[str] = None) -> None:
+        """
+        Запоминает время и источник обнаружения в буфере отложенной записи.
+        События одного никнейма и источника за минуту сливаются в одно
+        (число, первое и последнее время): видимый на каждом кадре ник дает
+        не больше 1440 строк истории в сутки.
+        """
+        detected_at = datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+        minute = detected_at[:16] + ':00'
+        with self._pending_lock:
+            for nickname in nicknames:
+                self._pending_detections[nickname] = (detected_at, source)
+                event = self._pending_events.get((nickname, source, minute))
+                if event is None:
+                    self._pending_events[(nickname, source, minute)] = [1, detected_at, detected_at]
+                else:
+                    event[0] += 1
+                    event[2] = detected_at
+            pending = len(self._pending_events)
+            if self._flush_thread is None:
+                self._start_flush_thread()
+
+        if pending >= config.DATABASE['DETECTION_FLUSH_SIZE']:
+            # Запись идет в фоновом потоке: проверка не ждет транзакцию
+            self._flush_wakeup.set()
+
+    def _mark_snapshot_dirty(self) -> None:
+        """Отмечает, что снимок для детекторов устарел после локальной записи"""
+        if not config.DATABASE['SNAPSHOT_PATH']:
+            return
+        with self._pending_lock:
+            self._snapshot_dirty = True
+            if self._snapshot_thread is None:
+                self._snapshot_thread = threading.Thread(
+                    target=self._snapshot_loop,
+                    name='snapshot-writer',
+                    daemon=True
+                )
+                self._snapshot_thread.start()
+
+    def _snapshot_loop(self) -> None:
+        """Раз в DETECTION_FLUSH_INTERVAL секунд перезаписывает снимок, если список менялся"""
+        while not self._flush_stop.wait(config.DATABASE['DETECTION_FLUSH_INTERVAL']):
+            self._write_snapshot_if_dirty()
+
+    def _start_flush_thread(self) -> None:
+        """Запускает фоновый поток периодического сброса буфера"""
+        self._flush_thread = threading.Thread(
+            target=self._flush_loop,
+            name='detections-flush',
+            daemon=True
+        )
+        self._flush_thread.start()
+
+    def _flush_loop(self) -> None:
+        """
+        Раз в DETECTION_FLUSH_INTERVAL секунд (или сразу при заполнении буфера)
+        сбрасывает буфер обнаружений и чистит устаревшую историю
+        """
+        while True:
+            self._flush_wakeup.wait(config.DATABASE['DETECTION_FLUSH_INTERVAL'])
+            self._flush_wakeup.clear()
+            if self._flush_stop.is_set():
+                return
+            self.flush_detections()
+            self._prune_if_due()
+            # Пауза между сбросами оставляет окно для записи другим соединениям,
+            # иначе под нагрузкой сброс держит блокировку записи почти постоянно
+            if self._flush_stop.wait(config.DATABASE['DETECTION_FLUSH_MIN_GAP']):
+                return
+
+    def _write_snapshot_if_dirty(self, force: bool = False) -> None:
+        """Перезаписывает снимок не чаще раза в DETECTION_FLUSH_INTERVAL секунд"""
+        now = time.monotonic()
+        with self._pending_lock:
+            if not self._snapshot_dirty:
+                return
+            if not force and now - self._snapshot_written_at < config.DATABASE['DETECTION_FLUSH_INTERVAL']:
+                return
+            self._snapshot_dirty = False
+            self._snapshot_written_at = now
+        try:
+            self.export_snapshot()
+        except OSError as e:
+            logger.error(f"Ошибка записи снимка никнеймов: {str(e)}")
+            with self._pending_lock:
+                self._snapshot_dirty = True
+
+    @metrics.DB_QUERY_SECONDS.timed(operation='export_snapshot')
+    def export_snapshot(self, path: Union[str, Path, None] = None) -> Dict:
+        """
+        Записывает снимок активных никнеймов для детекторов (см. snapshot.py).
+        Возвращает {'path', 'count', 'version', 'bytes'}.
+        """
+        path = path or config.DATABASE['SNAPSHOT_PATH']
+        if not path:
+            raise ValueError("Не задан путь снимка DATABASE_SNAPSHOT_PATH")
+        # Индекс сверяется с БД: изменения других процессов не должны потеряться
+        self._refresh_watchlist_if_stale(force=True)
+        with self._watchlist_lock:
+            nicknames = list(self._watchlist)
+        result = write_snapshot(path, nicknames)
+        logger.info(f"Снимок никнеймов записан: {result['path']} ({result['count']})")
+        return result
+
+    @metrics.DB_QUERY_SECONDS.timed(operation='flush_detections')
+    def flush_detections(self) -> int:
+        """
+        Записывает накопленные обнаружения одной транзакцией: last_detected,
+        события истории и приращения почасовых и посуточных сводок
+        """
+        with self._pending_lock:
+            if not self._pending_detections:
+                return 0
+            pending, events = self._pending_detections, self._pending_events
+            self._pending_detections, self._pending_events = {}, {}
+
+        # Сводки считаются в памяти: одна строка на никнейм, интервал и источник
+        rollups: Dict[Tuple[str, str, str, str], List] = {}
+        for (nickname, source, minute), (count, first_seen, last_seen) in events.items():
+            for bucket, bucket_start in (('hour', minute[:13] + ':00:00'),
+                                         ('day', minute[:10] + ' 00:00:00')):
+                rollup = rollups.setdefault(
+                    (nickname, bucket, bucket_start, source or ''), [0, first_seen, last_seen]
+                )
+                rollup[0] += count
+                rollup[1] = min(rollup[1], first_seen)
+                rollup[2] = max(rollup[2], last_seen)
+
         try:
             with self._get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
+                # Минута, начатая прошлым сбросом, дописывается в ту же строку
+                for (nickname, source, minute), (count, first_seen, last_seen) in events.items():
+                    cursor = conn.execute(
+                        f"""
+                        UPDATE {config.DATABASE['DETECTIONS_TABLE']} 
+                        SET count = count + ?, last_seen = MAX(last_seen, ?) 
+                        WHERE nickname = ? AND source IS ? AND detected_at = ?
+                        """,
+                        (count, last_seen, nickname, source, minute)
+                    )
+                    if cursor.rowcount:
+                        continue
+                    conn.execute(
+                        f"""
+                        INSERT INTO {config.DATABASE['DETECTIONS_TABLE']} 
+                        (nickname, source, detected_at, count, first_seen, last_seen) 
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        """,
+                        (nickname, source, minute, count, first_seen, last_seen)
+                    )
+                conn.executemany(
                     f"""
-                    SELECT 1 FROM {config.DATABASE['TABLE_NAME']} 
-                    WHERE nickname = ? AND is_active = 1
+                    INSERT INTO {config.DATABASE['ROLLUPS_TABLE']} 
+                    (nickname, bucket, bucket_start, source, count, first_seen, last_seen) 
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(nickname, bucket, bucket_start, source) 
+                    DO UPDATE SET count = count + excluded.count,
+                                  first_seen = MIN(first_seen, excluded.first_seen),
+                                  last_seen = MAX(last_seen, excluded.last_seen)
                     """,
-                    (nickname,)
+                    [key + tuple(values) for key, values in rollups.items()]
                 )
-                exists = cursor.fetchone() is not None
+                conn.executemany(
+                    f"""
+                    UPDATE {config.DATABASE['TABLE_NAME']} 
+                    SET last_detected = ?, last_detected_source = ? 
+                    WHERE nickname = ?
+                    """,
+                    [
+                        (detected_at, source, nickname)
+                        for nickname, (detected_at, source) in pending.items()
+                    ]
+                )
+                conn.commit()
+            logger.debug(f"Записано обнаружений: {len(pending)}")
+            return len(pending)
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка обновления времени обнаружения: {str(e)}")
+            # Возвращаем записи в буфер, не затирая более свежие отметки
+            with self._pending_lock:
+                for nickname, detection in pending.items():
+                    self._pending_detections.setdefault(nickname, detection)
+                for key, (count, first_seen, last_seen) in events.items():
+                    event = self._pending_events.setdefault(key, [0, first_seen, last_seen])
+                    event[0] += count
+                    event[1] = min(event[1], first_seen)
+                    event[2] = max(event[2], last_seen)
+            return 0
 
-                if exists:
-                    self._update_detection_time(nickname)
+    def _prune_if_due(self) -> None:
+        """Чистит историю не чаще раза в DETECTION_PRUNE_INTERVAL секунд"""
+        now = time.monotonic()
+        if now - self._pruned_at < config.DATABASE['DETECTION_PRUNE_INTERVAL']:
+            return
+        self._pruned_at = now
+        self.prune_detections()
 
-                return exists
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка при проверке никнейма {nickname}: {str(e)}")
-            return False
+    @metrics.DB_QUERY_SECONDS.timed(operation='prune_detections')
+    def prune_detections(self, batch_size: int = 10000) -> int:
+        """
+        Удаляет события старше DETECTION_RETENTION_DAYS и почасовые сводки старше
+        HOURLY_ROLLUP_RETENTION_DAYS. События удаляются порциями по индексу
+        detected_at, чтобы не держать блокировку записи долго.
+        Возвращает число удаленных строк.
+        """
+        now = datetime.now(timezone.utc)
+        events_before = (
+            now - timedelta(days=config.DATABASE['DETECTION_RETENTION_DAYS'])
+        ).strftime(TIMESTAMP_FORMAT)
+        hours_before = (
+            now - timedelta(days=config.DATABASE['HOURLY_ROLLUP_RETENTION_DAYS'])
+        ).strftime(TIMESTAMP_FORMAT)
 
-    def _update_detection_time(self, nickname: str) -> None:
-        """Обновляет время последнего обнаружения"""
+        removed = 0
         try:
+            while True:
+                with self._get_connection() as conn:
+                    cursor = conn.execute(
+                        f"""
+                        DELETE FROM {config.DATABASE['DETECTIONS_TABLE']} 
+                        WHERE id IN (
+                            SELECT id FROM {config.DATABASE['DETECTIONS_TABLE']} 
+                            WHERE detected_at < ? LIMIT ?
+                        )
+                        """,
+                        (events_before, batch_size)
+                    )
+                    conn.commit()
+                removed += cursor.rowcount
+                if cursor.rowcount < batch_size:
+                    break
+
             with self._get_connection() as conn:
-                conn.execute(
+                cursor = conn.execute(
                     f"""
-                    UPDATE {config.DATABASE['TABLE_NAME']} 
-                    SET last_detected = CURRENT_TIMESTAMP 
-                    WHERE nickname = ?
+                    DELETE FROM {config.DATABASE['ROLLUPS_TABLE']} 
+                    WHERE bucket = 'hour' AND bucket_start < ?
                     """,
-                    (nickname.strip(),)
+                    (hours_before,)
                 )
                 conn.commit()
+                removed += cursor.rowcount
         except sqlite3.Error as e:
-            logger.error(f"Ошибка обновления времени обнаружения: {str(e)}")
+            logger.error(f"Ошибка очистки истории обнаружений: {str(e)}")
+
+        if removed:
+            logger.info(f"Удалено устаревших записей истории обнаружений: {removed}")
+        return removed
+
+    @metrics.DB_QUERY_SECONDS.timed(operation='get_detection_stats')
+    def get_detection_stats(self, nickname: str, days: int = 7) -> Dict[str, Any]:
+        """
+        Статистика обнаружений никнейма из сводок: читается не больше
+        days + 24 строк на источник, сколько бы событий ни было.
+        Результат: {'nickname', 'days', 'total', 'last_24h', 'last_seen',
+                    'by_source': {источник: число}, 'by_day': [{'day', 'count'}]}
+        Сутки считаются по UTC, источник '' - неизвестен. Обнаружения из буфера
+        учитываются после сброса (до DETECTION_FLUSH_INTERVAL секунд).
+        """
+        nickname = nickname.strip()
+        now = datetime.now(timezone.utc)
+        day_from = (now - timedelta(days=days - 1)).strftime('%Y-%m-%d 00:00:00')
+        hour_from = (now - timedelta(hours=23)).strftime('%Y-%m-%d %H:00:00')
+        stats = {'nickname': nickname, 'days': days, 'total': 0, 'last_24h': 0,
+                 'last_seen': None, 'by_source': {}, 'by_day': []}
 
-    def get_all_nicknames(self, active_only: bool = True) -> List[Dict]:
-        """Возвращает список никнеймов с возможностью фильтрации"""
         try:
             with self._get_connection() as conn:
-                cursor = conn.cursor()
-                query = f"""
-                    SELECT 
-                        id, 
-                        nickname, 
-                        source, 
-                        datetime(created_at, 'localtime') as created_at,
-                        datetime(last_detected, 'localtime') as last_detected,
-                        is_active
-                    FROM {config.DATABASE['TABLE_NAME']}
-                """
-                if active_only:
-                    query += " WHERE is_active = 1"
-                query += " ORDER BY created_at DESC"
-
-                cursor.execute(query)
-                return [dict(row) for row in cursor.fetchall()]
+                rows = conn.execute(
+                    f"""
+                    SELECT bucket, bucket_start, source, count,
+                           datetime(last_seen, 'localtime') as last_seen
+                    FROM {config.DATABASE['ROLLUPS_TABLE']}
+                    WHERE nickname = ? AND bucket = 'day' AND bucket_start >= ?
+                    UNION ALL
+                    SELECT bucket, bucket_start, source, count,
+                           datetime(last_seen, 'localtime') as last_seen
+                    FROM {config.DATABASE['ROLLUPS_TABLE']}
+                    WHERE nickname = ? AND bucket = 'hour' AND bucket_start >= ?
+                    """,
+                    (nickname, day_from, nickname, hour_from)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении статистики {nickname}: {str(e)}")
+            return stats
+
+        by_day: Dict[str, int] = {}
+        for row in rows:
+            if row['bucket'] == 'hour':
+                stats['last_24h'] += row['count']
+                continue
+            stats['total'] += row['count']
+            stats['by_source'][row['source']] = stats['by_source'].get(row['source'], 0) + row['count']
+            day = row['bucket_start'][:10]
+            by_day[day] = by_day.get(day, 0) + row['count']
+            if stats['last_seen'] is None or row['last_seen'] > stats['last_seen']:
+                stats['last_seen'] = row['last_seen']
+        stats['by_day'] = [{'day': day, 'count': count} for day, count in sorted(by_day.items())]
+        return stats
+
+    def get_detections(self, nickname: str, since: Optional[datetime] = None,
+                       limit: int = 100) -> List[Dict]:
+        """
+        События обнаружения никнейма по минутам, новые первыми (не старше срока
+        хранения): {'detected_at' (начало минуты), 'source', 'count', 'first_seen', 'last_seen'}
+        """
+        query = f"""
+            SELECT 
+                datetime(detected_at, 'localtime') as detected_at, 
+                source, 
+                count,
+                datetime(first_seen, 'localtime') as first_seen,
+                datetime(last_seen, 'localtime') as last_seen
+            FROM {config.DATABASE['DETECTIONS_TABLE']}
+            WHERE nickname = ?
+        """
+        params: List[Any] = [nickname.strip()]
+        if since is not None:
+            query += " AND detected_at >= ?"
+            params.append(since.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT))
+        query += " ORDER BY detected_at DESC LIMIT ?"
+        params.append(limit)
+
+        try:
+            with self._get_connection() as conn:
+                return [dict(row) for row in conn.execute(query, params).fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении истории {nickname}: {str(e)}")
+            return []
+
+    def get_top_detected(self, days: int = 7, limit: int = 10) -> List[Dict]:
+        """Чаще всего обнаруживаемые никнеймы за days суток (по посуточным сводкам)"""
+        day_from = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime('%Y-%m-%d 00:00:00')
+        try:
+            with self._get_connection() as conn:
+                rows = conn.execute(
+                    f"""
+                    SELECT nickname, SUM(count) as count,
+                           datetime(MAX(last_seen), 'localtime') as last_seen
+                    FROM {config.DATABASE['ROLLUPS_TABLE']}
+                    WHERE bucket = 'day' AND bucket_start >= ?
+                    GROUP BY nickname
+                    ORDER BY count DESC
+                    LIMIT ?
+                    """,
+                    (day_from, limit)
+                ).fetchall()
+                return [dict(row) for row in rows]
         except sqlite3.Error as e:
-            logger.error(f"Ошибка при получении списка никнеймов: {str(e)}")
+            logger.error(f"Ошибка при получении топа обнаружений: {str(e)}")
             return []
 
+    def close(self) -> None:
+        """Останавливает фоновый сброс и записывает остаток буфера"""
+        self._flush_stop.set()
+        self._flush_wakeup.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+            self._flush_thread = None
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+        if self._refresh_thread is not None:
+            self._refresh_thread.join()
+        self.flush_detections()
+        self._write_snapshot_if_dirty(force=True)
+        self._pool.close()
+
+    @metrics.DB_QUERY_SECONDS.timed(operation='get_nicknames_page')
+    def get_nicknames_page(self, cursor: Optional[int] = None, limit: int = 50,
+                           active_only: bool = True, direction: str = 'next') -> Dict[str, Any]:
+        """
+        Возвращает страницу никнеймов (новые первыми) с пагинацией по id.
+        direction='next' берет записи старше cursor, 'prev' - новее cursor.
+        Результат: {'nicknames': [...], 'next_cursor': id | None, 'prev_cursor': id | None}
+        """
+        if direction not in ('next', 'prev'):
+            raise ValueError(f"Неизвестное направление: {direction}")
+
+        conditions = []
+        params: List[Any] = []
+        if active_only:
+            conditions.append("is_active = 1")
+        if cursor is not None:
+            conditions.append("id < ?" if direction == 'next' else "id > ?")
+            params.append(cursor)
+
+        query = f"""
+            SELECT 
+                id, 
+                nickname, 
+                source, 
+                datetime(created_at, 'localtime') as created_at,
+                datetime(last_detected, 'localtime') as last_detected,
+                last_detected_source,
+                is_active
+            FROM {config.DATABASE['TABLE_NAME']}
+        """
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id DESC" if direction == 'next' else " ORDER BY id ASC"
+        query += " LIMIT ?"
+        # Одна лишняя запись показывает, есть ли следующая страница
+        params.append(limit + 1)
+
+        try:
+            with self._get_connection() as conn:
+                rows = [dict(row) for row in conn.execute(query, params).fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении страницы никнеймов: {str(e)}")
+            return {'nicknames': [], 'next_cursor': None, 'prev_cursor': None}
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if direction == 'prev':
+            rows.reverse()
+            has_next, has_prev = cursor is not None, has_more
+        else:
+            has_next, has_prev = has_more, cursor is not None
+
+        return {
+            'nicknames': rows,
+            'next_cursor': rows[-1]['id'] if rows and has_next else None,
+            'prev_cursor': rows[0]['id'] if rows and has_prev else None
+        }
+
+    def iter_nicknames(self, active_only: bool = True, batch_size: int = 500) -> Iterator[Dict]:
+        """Постранично перебирает никнеймы, не загружая всю таблицу в память"""
+        cursor = None
+        while True:
+            page = self.get_nicknames_page(cursor, batch_size, active_only)
+            yield from page['nicknames']
+            cursor = page['next_cursor']
+            if cursor is None:
+                return
+
+    def migrate_legacy_db(self, legacy_path: Union[str, Path, None] = None) -> int:
+        """Переносит никнеймы из старой таблицы nicknames API-сервера (однократно)"""
+        legacy_path = Path(legacy_path or config.DATABASE['LEGACY_PATH'])
+        if not legacy_path.exists():
+            return 0
+
+        try:
+            legacy = sqlite3.connect(legacy_path)
+            try:
+                rows = legacy.execute(
+                    "SELECT nickname, source, created_at FROM nicknames"
+                ).fetchall()
+            finally:
+                legacy.close()
+
+            with self._get_connection() as conn:
+                cursor = conn.executemany(
+                    f"""
+                    INSERT INTO {config.DATABASE['TABLE_NAME']} 
+                    (nickname, source, created_at) 
+                    VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                    ON CONFLICT(nickname) DO NOTHING
+                    """,
+                    rows
+                )
+                conn.commit()
+                migrated = max(cursor.rowcount, 0)
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка миграции старой БД {legacy_path}: {str(e)}")
+            return 0
+
+        # Переименовываем старый файл, чтобы миграция не повторялась
+        try:
+            legacy_path.rename(legacy_path.with_name(legacy_path.name + '.migrated'))
+        except FileNotFoundError:
+            # Параллельно запущенный процесс (uvicorn --workers N) уже перенес файл
+            pass
+        self._load_watchlist()
+        logger.info(f"Перенесено никнеймов из {legacy_path}: {migrated} из {len(rows)}")
+        return migrated
+
     def backup_database(self) -> Optional[Path]:
         """Создает резервную копию базы данных"""
         try:
@@ -224,5 +1231,67 @@ class Database:
             return None
 
 
-# Глобальный экземпляр для использования в других модулях
-db = Database()
+class AsyncDatabase:
+    """
+    Асинхронная обертка над Database для обработчиков бота.
+    Вызовы SQLite выполняются в отдельном пуле потоков и не блокируют цикл событий.
+    """
+
+    def __init__(self, database: Database, max_workers: int = None):
+        self.db = database
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or config.DATABASE['POOL_SIZE'],
+            thread_name_prefix='db'
+        )
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполняет синхронную функцию в пуле потоков БД"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def add_nickname(self, nickname: str, source: str = 'manual') -> bool:
+        return await self.run(self.db.add_nickname, nickname, source)
+
+    async def add_nicknames(self, records: Iterable[Tuple[str, str]]) -> Dict[str, int]:
+        return await self.run(self.db.add_nicknames, records)
+
+    async def remove_nickname(self, nickname: str, soft_delete: bool = True) -> bool:
+        return await self.run(self.db.remove_nickname, nickname, soft_delete)
+
+    async def check_nickname(self, nickname: str) -> bool:
+        return await self.run(self.db.check_nickname, nickname)
+
+    async def match_nickname(self, nickname: str, mode: str = 'exact') -> Optional[Dict]:
+        return await self.run(self.db.match_nickname, nickname, mode)
+
+    async def get_nicknames_page(self, cursor: Optional[int] = None, limit: int = 50,
+                                 active_only: bool = True, direction: str = 'next') -> Dict[str, Any]:
+        return await self.run(self.db.get_nicknames_page, cursor, limit, active_only, direction)
+
+    async def get_detection_stats(self, nickname: str, days: int = 7) -> Dict[str, Any]:
+        return await self.run(self.db.get_detection_stats, nickname, days)
+
+    def close(self) -> None:
+        """Дожидается текущих запросов и останавливает пул потоков"""
+        self._executor.shutdown(wait=True)
+
+
+_instances: Dict[str, Any] = {}
+_instances_lock = threading.Lock()
+
+
+def __getattr__(name: str) -> Any:
+    """
+    Глобальные экземпляры db и adb создаются при первом обращении, а не при
+    импорте модуля: процессы, которым SQLite не нужен (детектор со снимком),
+    не открывают БД вовсе.
+    """
+    if name not in ('db', 'adb'):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _instances_lock:
+        if 'db' not in _instances:
+            _instances['db'] = Database()
+            _instances['adb'] = AsyncDatabase(_instances['db'])
+        # Последующие обращения идут к атрибуту модуля напрямую
+        globals().update(_instances)
+    return _instances[name]
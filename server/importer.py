@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Массовый импорт и экспорт списков никнеймов (CSV / NDJSON)
+
+Запуск из командной строки:
+    python importer.py import partners.csv --source partner
+    python importer.py export --format ndjson > nicknames.ndjson
+    python importer.py snapshot                # снимок для детекторов (snapshot.py)
+"""
+
+import argparse
+import csv
+import io
+import json
+import logging
+import sys
+from typing import Dict, IO, Iterator, Optional, Tuple
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+EXPORT_COLUMNS = ['id', 'nickname', 'source', 'created_at', 'last_detected',
+                  'last_detected_source', 'is_active']
+
+
+def detect_format(filename: Optional[str], default: Optional[str] = 'csv') -> Optional[str]:
+    """Определяет формат по расширению файла"""
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    if filename and filename.lower().endswith(('.csv', '.txt')):
+        return 'csv'
+    return default
+
+
+def iter_csv(stream: IO[str], source: str) -> Iterator[Tuple[str, str]]:
+    """
+    Читает CSV: либо с заголовком (колонка nickname и необязательная source),
+    либо без него - тогда никнейм в первой колонке.
+    """
+    reader = csv.reader(stream)
+    nickname_col, source_col = 0, None
+    for line_no, row in enumerate(reader):
+        if not row:
+            continue
+        if line_no == 0:
+            header = [cell.strip().lower() for cell in row]
+            if 'nickname' in header:
+                nickname_col = header.index('nickname')
+                source_col = header.index('source') if 'source' in header else None
+                continue
+        nickname = row[nickname_col] if nickname_col < len(row) else ''
+        row_source = row[source_col] if source_col is not None and source_col < len(row) else ''
+        yield nickname, row_source.strip() or source
+
+
+def iter_ndjson(stream: IO[str], source: str) -> Iterator[Tuple[str, str]]:
+    """
+    Читает NDJSON: каждая строка - объект {"nickname": ..., "source": ...}
+    или просто строка с никнеймом. Некорректные строки отдаются пустыми
+    и попадают в счетчик пропущенных.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            logger.warning(f"Некорректная строка NDJSON: {line[:100]}")
+            yield '', source
+            continue
+
+        if isinstance(record, str):
+            yield record, source
+        elif isinstance(record, dict) and isinstance(record.get('nickname'), str):
+            yield record['nickname'], record.get('source') or source
+        else:
+            yield '', source
+
+
+def import_stream(stream: IO[str], fmt: str = 'csv', source: str = 'import') -> Dict[str, int]:
+    """Импортирует никнеймы из текстового потока, не загружая его целиком"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Неподдерживаемый формат: {fmt}")
+    records = iter_csv(stream, source) if fmt == 'csv' else iter_ndjson(stream, source)
+    return db.add_nicknames(records)
+
+
+def import_bytes(stream: IO[bytes], fmt: str = 'csv', source: str = 'import') -> Dict[str, int]:
+    """Импортирует никнеймы из бинарного потока (HTTP-запрос, файл Telegram)"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        return import_stream(text, fmt, source)
+    finally:
+        text.detach()
+
+
+def export_lines(fmt: str = 'ndjson', active_only: bool = True) -> Iterator[str]:
+    """Построчно выгружает никнеймы в CSV или NDJSON"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Неподдерживаемый формат: {fmt}")
+
+    if fmt == 'ndjson':
+        for row in db.iter_nicknames(active_only=active_only):
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    for row in db.iter_nicknames(active_only=active_only):
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Импорт и экспорт никнеймов")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help="Импортировать файл CSV/NDJSON")
+    import_parser.add_argument('path', help="Путь к файлу или - для stdin")
+    import_parser.add_argument('--format', choices=FORMATS, help="Формат (по расширению)")
+    import_parser.add_argument('--source', default='import', help="Источник по умолчанию")
+
+    export_parser = commands.add_parser('export', help="Выгрузить никнеймы в stdout")
+    export_parser.add_argument('--format', choices=FORMATS, default='ndjson')
+    export_parser.add_argument('--all', action='store_true', help="Включить неактивные")
+
+    snapshot_parser = commands.add_parser('snapshot', help="Записать снимок для детекторов")
+    snapshot_parser.add_argument('path', nargs='?', help="Путь (по умолчанию DATABASE_SNAPSHOT_PATH)")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'import':
+        fmt = args.format or detect_format(args.path)
+        if args.path == '-':
+            counts = import_stream(sys.stdin, fmt, args.source)
+        else:
+            with open(args.path, encoding='utf-8-sig', newline='') as f:
+                counts = import_stream(f, fmt, args.source)
+        print(json.dumps(counts, ensure_ascii=False))
+    elif args.command == 'snapshot':
+        print(json.dumps(db.export_snapshot(args.path), ensure_ascii=False))
+    else:
+        for line in export_lines(args.format, active_only=not args.all):
+            sys.stdout.write(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Нечеткое сопоставление никнеймов с учетом ошибок OCR
+"""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, Optional, Set
+
+from config import config
+
+# Символы, которые Tesseract (rus+eng) путает между собой.
+# Все варианты сводятся к одному латинскому символу.
+CONFUSABLES = str.maketrans({
+    # Цифры и знаки, похожие на буквы
+    '0': 'o',
+    '1': 'l',
+    'i': 'l',
+    '|': 'l',
+    '!': 'l',
+    # Кириллические гомоглифы латинских букв (после casefold)
+    'а': 'a',
+    'в': 'b',
+    'е': 'e',
+    'ё': 'e',
+    'к': 'k',
+    'м': 'm',
+    'н': 'h',
+    'о': 'o',
+    'р': 'p',
+    'с': 'c',
+    'т': 't',
+    'у': 'y',
+    'х': 'x',
+    'і': 'l',
+})
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize(nickname: str) -> str:
+    """Приводит никнейм к канонической форме для нечеткого сравнения"""
+    text = unicodedata.normalize('NFKC', nickname).casefold()
+    text = text.translate(CONFUSABLES)
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def damerau_levenshtein(a: str, b: str, max_distance: int) -> int:
+    """
+    Расстояние Дамерау-Левенштейна (optimal string alignment).
+    Возвращает max_distance + 1, если расстояние больше max_distance.
+    """
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous = None
+    current = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous = previous, current
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + cost
+            )
+            if (before is not None and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+
+    return min(current[-1], max_distance + 1)
+
+
+def _deletes(word: str, max_distance: int) -> Set[str]:
+    """Все варианты слова с удалением до max_distance символов"""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {
+            variant[:i] + variant[i + 1:]
+            for variant in frontier
+            for i in range(len(variant))
+        }
+        result |= frontier
+    return result
+
+
+class FuzzyMatcher:
+    """
+    Индекс в стиле SymSpell: словарь удалений для нормализованных никнеймов.
+    Поиск генерирует удаления запроса и проверяет только найденных кандидатов,
+    поэтому время не зависит линейно от размера списка.
+    """
+
+    def __init__(self, nicknames: Iterable[str] = (), max_distance: int = None):
+        self.max_distance = (
+            max_distance if max_distance is not None
+            else config.MATCHING['MAX_DISTANCE']
+        )
+        # нормализованная форма -> исходные никнеймы
+        self._canonical: Dict[str, Set[str]] = {}
+        # удаление -> нормализованные формы
+        self._deletes: Dict[str, Set[str]] = {}
+        for nickname in nicknames:
+            self.add(nickname)
+
+    def __len__(self) -> int:
+        return sum(len(names) for names in self._canonical.values())
+
+    def add(self, nickname: str) -> None:
+        """Добавляет никнейм в индекс"""
+        key = normalize(nickname)
+        if not key:
+            return
+        names = self._canonical.setdefault(key, set())
+        if not names:
+            for variant in _deletes(key, self.max_distance):
+                self._deletes.setdefault(variant, set()).add(key)
+        names.add(nickname)
+
+    def remove(self, nickname: str) -> None:
+        """Удаляет никнейм из индекса"""
+        key = normalize(nickname)
+        names = self._canonical.get(key)
+        if not names:
+            return
+        names.discard(nickname)
+        if names:
+            return
+
+        del self._canonical[key]
+        for variant in _deletes(key, self.max_distance):
+            keys = self._deletes.get(variant)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._deletes[variant]
+
+    def _allowed_distance(self, key: str, candidate: str = None) -> int:
+        """
+        Допустимое число правок: короткие никнеймы сравниваются строже.
+        Считается по более короткой из строк, иначе короткий никнейм
+        совпадал бы с любым длинным словом, которое с него начинается.
+        """
+        per_edit = config.MATCHING['MIN_LENGTH_PER_EDIT']
+        length = len(key) if candidate is None else min(len(key), len(candidate))
+        return min(self.max_distance, length // per_edit)
+
+    def match(self, nickname: str) -> Optional[Dict]:
+        """
+        Ищет ближайший отслеживаемый никнейм.
+        Возвращает {'nickname': <канонический никнейм>, 'distance': <число правок>}
+        или None, если совпадений нет.
+        """
+        key = normalize(nickname)
+        if not key:
+            return None
+
+        names = self._canonical.get(key)
+        if names:
+            return {'nickname': self._pick(names, nickname), 'distance': 0}
+
+        max_distance = self._allowed_distance(key)
+        if max_distance == 0:
+            return None
+
+        best_key, best_distance = None, max_distance + 1
+        seen = set()
+        for variant in _deletes(key, max_distance):
+            for candidate in self._deletes.get(variant, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                allowed = self._allowed_distance(key, candidate)
+                if allowed == 0:
+                    continue
+                distance = damerau_levenshtein(key, candidate, allowed)
+                if distance > allowed:
+                    continue
+                if distance < best_distance or (
+                        distance == best_distance and candidate < best_key):
+                    best_key, best_distance = candidate, distance
+
+        if best_key is None:
+            return None
+        return {
+            'nickname': self._pick(self._canonical[best_key], nickname),
+            'distance': best_distance
+        }
+
+    @staticmethod
+    def _pick(names: Set[str], nickname: str) -> str:
+        """Выбирает исходный никнейм среди совпавших по нормализованной форме"""
+        stripped = nickname.strip()
+        return stripped if stripped in names else min(names)
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Метрики в текстовом формате Prometheus
+
+Счетчики, гистограммы и датчики без внешних зависимостей. Веб-процессы
+отдают их на /metrics, бот и монитор экрана - через start_http_server().
+Метрики живут в памяти процесса: каждый процесс uvicorn --workers N отдает
+свои на отдельном порту (см. asgi.py), суммирует их Prometheus.
+"""
+
+import abc
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Границы корзин по умолчанию (секунды): от 50 мкс до 10 с
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List['_Metric'] = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class _Metric(abc.ABC):
+    kind = ''
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[str]:
+        """Строки значений метрики в текстовом формате"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик с необязательными метками"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+
+class Gauge(_Metric):
+    """Текущее значение: задается set() или вычисляется функцией при выгрузке"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float] = None):
+        super().__init__(name, documentation)
+        self._value = 0.0
+        self._function = function
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def samples(self) -> Iterator[str]:
+        value = self._value
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception as e:
+                logger.debug(f"Не удалось вычислить {self.name}: {str(e)}")
+        yield f"{self.name} {value}"
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам (накопительно, как в Prometheus)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> [счетчики корзин..., +Inf], сумма
+        self._values: Dict[Tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Замеряет длительность блока в секундах"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def timed(self, **labels) -> Callable:
+        """Декоратор: замеряет длительность каждого вызова функции"""
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(key + (('le', le),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(key)} {total}"
+            yield f"{self.name}_count{_format_labels(key)} {cumulative}"
+
+
+def render() -> str:
+    """Все зарегистрированные метрики в текстовом формате Prometheus"""
+    with _registry_lock:
+        metrics = list(_registry)
+    return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_http_server(port: int, host: str = '0.0.0.0',
+                      attempts: int = 1) -> Optional[ThreadingHTTPServer]:
+    """
+    Отдает /metrics в фоновом потоке (для процессов без веб-сервера).
+    При attempts > 1 занимает первый свободный порт из port..port + attempts - 1:
+    так несколько рабочих процессов получают каждый свой порт.
+    """
+    if not port:
+        return None
+    for candidate in range(port, port + max(attempts, 1)):
+        try:
+            server = ThreadingHTTPServer((host, candidate), _MetricsHandler)
+        except OSError:
+            continue
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+        logger.info(f"Метрики доступны на порту {candidate}")
+        return server
+    logger.error(f"Нет свободного порта для метрик в диапазоне {port}-{port + attempts - 1}")
+    return None
+
+
+# Метрики горячих путей
+CHECKS = Counter('nickname_checks_total', "Проверки никнеймов по результату (hit/miss)")
+DB_QUERY_SECONDS = Histogram('db_query_seconds', "Длительность операций с SQLite")
+OCR_SECONDS = Histogram('ocr_seconds', "Длительность OCR строк одного кадра")
+REQUEST_SECONDS = Histogram('http_request_seconds', "Длительность обработки HTTP-запросов API")
+BOT_COMMANDS = Counter('bot_commands_total', "Команды, обработанные ботом")
+NOTIFICATIONS = Counter('notifications_total', "Уведомления о совпадениях по результату")
+WATCHLIST_SIZE = Gauge('watchlist_size', "Число активных никнеймов в индексе в памяти")
+OCR_CACHE_HIT_RATIO = Gauge('ocr_cache_hit_ratio', "Доля строк, взятых из кэша OCR")
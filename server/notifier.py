@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Асинхронная рассылка уведомлений о найденных никнеймах в Telegram
+
+Детектор вызывает notify() из любого потока и сразу возвращается;
+отправкой занимается задача в цикле событий бота:
+- повторные срабатывания одного никнейма в течение COOLDOWN подавляются;
+- срабатывания за DIGEST_WINDOW секунд собираются в одно сообщение;
+- вызовы Bot API ограничены корзиной токенов (RATE_LIMIT сообщений в секунду).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from config import config
+import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.LOGGING['LEVEL'])
+
+# Лимит длины сообщения Telegram (с запасом)
+MAX_MESSAGE_LENGTH = 4000
+
+
+class TokenBucket:
+    """Ограничитель частоты: rate токенов в секунду, не более capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        """Ждет, пока появится токен, и забирает его"""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class NotificationDispatcher:
+    """Очередь уведомлений с антиспамом и сводками для чата оповещений"""
+
+    def __init__(self, bot, chat_id, cooldown: float = None, digest_window: float = None,
+                 rate_limit: float = None, queue_size: int = None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.cooldown = cooldown if cooldown is not None else config.TELEGRAM['NOTIFICATION_COOLDOWN']
+        self.digest_window = (
+            digest_window if digest_window is not None
+            else config.TELEGRAM['NOTIFICATION_DIGEST_WINDOW']
+        )
+        rate_limit = rate_limit or config.TELEGRAM['NOTIFICATION_RATE_LIMIT']
+        self.limiter = TokenBucket(rate_limit, max(1.0, rate_limit))
+        self._queue_size = queue_size or config.TELEGRAM['NOTIFICATION_QUEUE_SIZE']
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_sent: Dict[str, float] = {}
+        self.sent = 0
+        self.suppressed = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        """Запускает задачу рассылки в текущем цикле событий"""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает рассылку"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self, nickname: str, source: Optional[str] = None) -> None:
+        """
+        Ставит уведомление в очередь; безопасно вызывать из любого потока.
+        source - где найден никнейм (имя области экрана).
+        """
+        if self._loop is None or self._loop.is_closed():
+            logger.warning(f"Рассылка не запущена, уведомление пропущено: {nickname}")
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._enqueue(nickname, source)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, nickname, source)
+
+    def _enqueue(self, nickname: str, source: Optional[str] = None) -> None:
+        try:
+            self._queue.put_nowait((nickname, source))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            metrics.NOTIFICATIONS.inc(result='dropped')
+            logger.warning(f"Очередь уведомлений переполнена, пропущено: {nickname}")
+
+    def _in_cooldown(self, nickname: str, now: float) -> bool:
+        last = self._last_sent.get(nickname)
+        return last is not None and now - last < self.cooldown
+
+    async def _collect(self) -> Dict[str, Dict[Optional[str], int]]:
+        """
+        Ждет первое срабатывание и собирает остальные за окно сводки.
+        Возвращает nickname -> {источник: число срабатываний}.
+        """
+        pending: Dict[str, Dict[Optional[str], int]] = {}
+        deadline = None
+        while True:
+            timeout = None if deadline is None else deadline - time.monotonic()
+            if timeout is not None and timeout <= 0:
+                return pending
+            try:
+                nickname, source = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return pending
+
+            if self._in_cooldown(nickname, time.monotonic()):
+                self.suppressed += 1
+                metrics.NOTIFICATIONS.inc(result='suppressed')
+                continue
+            sources = pending.setdefault(nickname, {})
+            sources[source] = sources.get(source, 0) + 1
+            if deadline is None:
+                deadline = time.monotonic() + self.digest_window
+
+    async def _run(self) -> None:
+        while True:
+            pending = await self._collect()
+            if not pending:
+                continue
+            now = time.monotonic()
+            for nickname in pending:
+                self._last_sent[nickname] = now
+            for text in format_digest(pending):
+                await self._send(text)
+
+    async def _send(self, text: str) -> None:
+        """Отправляет сообщение с учетом лимита и ответа RetryAfter"""
+        for _ in range(3):
+            await self.limiter.acquire()
+            try:
+                await self.bot.send_message(chat_id=self.chat_id, text=text)
+                self.sent += 1
+                metrics.NOTIFICATIONS.inc(result='sent')
+                return
+            except Exception as e:
+                retry_after = getattr(e, 'retry_after', None)
+                if retry_after is None:
+                    logger.error(f"Ошибка отправки уведомления: {str(e)}")
+                    metrics.NOTIFICATIONS.inc(result='failed')
+                    return
+                if hasattr(retry_after, 'total_seconds'):
+                    retry_after = retry_after.total_seconds()
+                logger.warning(f"Превышен лимит Bot API, ждем {retry_after} с")
+                await asyncio.sleep(float(retry_after))
+        logger.error("Уведомление не отправлено после повторных попыток")
+        metrics.NOTIFICATIONS.inc(result='failed')
+
+
+def _describe_sources(sources: Dict[Optional[str], int]) -> str:
+    names = [name for name in sources if name]
+    return f" [{', '.join(names)}]" if names else ""
+
+
+def format_digest(pending: Dict[str, Dict[Optional[str], int]]) -> List[str]:
+    """
+    Формирует текст уведомления из nickname -> {источник: число срабатываний};
+    длинная сводка делится на несколько сообщений
+    """
+    if len(pending) == 1:
+        nickname, sources = next(iter(pending.items()))
+        return [f"🔔 Найден ник: {nickname}!{_describe_sources(sources)}"]
+
+    lines = []
+    for nickname, sources in pending.items():
+        count = sum(sources.values())
+        lines.append(
+            f"• {nickname}" + (f" (×{count})" if count > 1 else "") + _describe_sources(sources)
+        )
+    messages, current = [], "🔔 Найдены ники:"
+    for line in lines:
+        if len(current) + len(line) + 1 > MAX_MESSAGE_LENGTH:
+            messages.append(current)
+            current = "🔔 Найдены ники (продолжение):"
+        current += "\n" + line
+    messages.append(current)
+    return messages
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Поиск всех отслеживаемых никнеймов в тексте кадра OCR (алгоритм Ахо-Корасик)
+"""
+
+import threading
+from array import array
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import config
+
+# Собранный автомат хранится в плоских массивах uint32 (порядок важен для снимка)
+AUTOMATON_ARRAYS = ('edge_start', 'edge_chars', 'edge_targets', 'fail', 'output', 'terminal', 'depth')
+
+# Размер части дополнительного автомата: заполненные части не пересобираются,
+# поэтому новый никнейм стоит при поиске не больше сборки над DELTA_LIMIT ключами
+DELTA_LIMIT = 1000
+
+
+def fold(text: str) -> str:
+    """Понижает регистр посимвольно, сохраняя позиции символов"""
+    return ''.join(ch if len(ch.lower()) != 1 else ch.lower() for ch in text)
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+
+def _at_boundaries(text: str, start: int, end: int) -> bool:
+    """Проверяет, что совпадение не является частью более длинного слова"""
+    if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+        return False
+    if end < len(text) and _is_word_char(text[end]) and _is_word_char(text[end - 1]):
+        return False
+    return True
+
+
+class Automaton:
+    """
+    Неизменяемый автомат Ахо-Корасик в плоских массивах uint32:
+        edge_start    начало переходов узла в edge_chars/edge_targets (узлов + 1)
+        edge_chars    коды символов переходов, по возрастанию внутри узла
+        edge_targets  узлы, в которые ведут переходы
+        fail          суффиксная ссылка узла
+        output        ближайший конечный узел по суффиксным ссылкам (0 - нет)
+        terminal      номер слова + 1 для конечного узла (0 - не конечный)
+        depth         длина ключа до узла в символах
+    Массивы могут быть и memoryview над mmap (см. snapshot.py).
+    """
+
+    def __init__(self, arrays: Dict[str, Sequence[int]], ignore_case: bool, whole_words: bool):
+        for name in AUTOMATON_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.ignore_case = ignore_case
+        self.whole_words = whole_words
+        # Переходы корня нужны почти на каждом символе текста: держим их словарем
+        self._root = {
+            self.edge_chars[edge]: self.edge_targets[edge]
+            for edge in range(self.edge_start[0], self.edge_start[1])
+        }
+
+    @property
+    def nodes(self) -> int:
+        return len(self.fail)
+
+    @property
+    def edges(self) -> int:
+        return len(self.edge_chars)
+
+    def arrays(self) -> Dict[str, Sequence[int]]:
+        return {name: getattr(self, name) for name in AUTOMATON_ARRAYS}
+
+    @classmethod
+    def build(cls, words: Sequence[str], ignore_case: bool, whole_words: bool) -> 'Automaton':
+        """
+        Собирает автомат над словами. Слова с одинаковым ключом (при ignore_case)
+        делят конечный узел, он отдается первому из них.
+        """
+        goto: List[Dict[str, int]] = [{}]
+        terminal = [0]
+        depth = [0]
+        for index, word in enumerate(words):
+            node = 0
+            for ch in fold(word) if ignore_case else word:
+                next_node = goto[node].get(ch)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto[node][ch] = next_node
+                    goto.append({})
+                    terminal.append(0)
+                    depth.append(depth[node] + 1)
+                node = next_node
+            if node and not terminal[node]:
+                terminal[node] = index + 1
+
+        # Суффиксные и выходные ссылки обходом в ширину
+        fail = [0] * len(goto)
+        output = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                link = fail[node]
+                while link and ch not in goto[link]:
+                    link = fail[link]
+                link = goto[link].get(ch, 0)
+                fail[child] = link
+                output[child] = link if terminal[link] else output[link]
+                queue.append(child)
+
+        edge_start = array('I', [0])
+        edge_chars = array('I')
+        edge_targets = array('I')
+        for transitions in goto:
+            for ch in sorted(transitions):
+                edge_chars.append(ord(ch))
+                edge_targets.append(transitions[ch])
+            edge_start.append(len(edge_chars))
+
+        return cls({
+            'edge_start': edge_start, 'edge_chars': edge_chars, 'edge_targets': edge_targets,
+            'fail': array('I', fail), 'output': array('I', output),
+            'terminal': array('I', terminal), 'depth': array('I', depth)
+        }, ignore_case, whole_words)
+
+    def scan(self, text: str) -> List[Tuple[int, int, int]]:
+        """Все вхождения слов в тексте: список (номер слова, start, end)"""
+        edge_start, edge_chars, edge_targets = self.edge_start, self.edge_chars, self.edge_targets
+        fail, output, terminal, depth = self.fail, self.output, self.terminal, self.depth
+        haystack = fold(text) if self.ignore_case else text
+
+        root = self._root
+
+        hits = []
+        state = 0
+        for i, ch in enumerate(haystack):
+            code = ord(ch)
+            while state:
+                low, high = edge_start[state], edge_start[state + 1]
+                edge = bisect_left(edge_chars, code, low, high)
+                if edge < high and edge_chars[edge] == code:
+                    state = edge_targets[edge]
+                    break
+                state = fail[state]
+            else:
+                state = root.get(code, 0)
+
+            node = state if terminal[state] else output[state]
+            while node:
+                start = i - depth[node] + 1
+                if not self.whole_words or _at_boundaries(text, start, i + 1):
+                    hits.append((terminal[node] - 1, start, i + 1))
+                node = output[node]
+        return hits
+
+
+class NicknameScanner:
+    """
+    Автомат Ахо-Корасик над активными никнеймами.
+    Текст кадра просматривается за один линейный проход. add/remove не
+    трогают собранный автомат: добавленные никнеймы сразу ищутся
+    дополнительными автоматами (частями по DELTA_LIMIT ключей), удаленные отбрасываются из результатов, а полный
+    автомат пересобирается в фоновом потоке и подменяется целиком. Поиск
+    все это время идет по прежнему автомату.
+    """
+
+    def __init__(self, nicknames: Iterable[str] = (), ignore_case: bool = None,
+                 whole_words: bool = None):
+        self.ignore_case = (
+            ignore_case if ignore_case is not None
+            else config.MATCHING['SCAN_IGNORE_CASE']
+        )
+        self.whole_words = (
+            whole_words if whole_words is not None
+            else config.MATCHING['SCAN_WHOLE_WORDS']
+        )
+        self._lock = threading.Lock()
+        # ключ -> никнеймы с этим ключом (в порядке добавления)
+        self._names: Dict[str, Dict[str, None]] = {}
+        for nickname in nicknames:
+            self._insert(nickname)
+
+        self._keys = list(self._names)
+        self._base_keys = set(self._keys)
+        self._automaton = Automaton.build(self._keys, self.ignore_case, self.whole_words)
+        # Ключи, добавленные после сборки основного автомата, и автоматы над ними
+        # (каждый покрывает очередные DELTA_LIMIT ключей из _delta_keys)
+        self._delta_keys: List[str] = []
+        self._delta: List[Tuple[Automaton, List[str]]] = []
+        self._changed = False
+        self._rebuild_thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(names) for names in self._names.values())
+
+    def _key(self, nickname: str) -> str:
+        return fold(nickname) if self.ignore_case else nickname
+
+    def _insert(self, nickname: str) -> Optional[str]:
+        """Запоминает никнейм; возвращает ключ, если он новый"""
+        nickname = nickname.strip()
+        if not nickname:
+            return None
+        key = self._key(nickname)
+        names = self._names.setdefault(key, {})
+        names[nickname] = None
+        return key if len(names) == 1 else None
+
+    def add(self, nickname: str) -> None:
+        """Добавляет никнейм: он ищется сразу, автомат пересобирается в фоне"""
+        with self._lock:
+            key = self._insert(nickname)
+            if key is None:
+                return
+            if key not in self._base_keys:
+                self._delta_keys.append(key)
+            self._schedule_rebuild()
+
+    def remove(self, nickname: str) -> None:
+        """Убирает никнейм: из результатов сразу, из автомата - при пересборке"""
+        nickname = nickname.strip()
+        with self._lock:
+            key = self._key(nickname)
+            names = self._names.get(key)
+            if names is None or nickname not in names:
+                return
+            del names[nickname]
+            if names:
+                return
+            del self._names[key]
+            if key in self._delta_keys:
+                self._delta_keys.remove(key)
+                self._delta = []
+            self._schedule_rebuild()
+
+    def _schedule_rebuild(self) -> None:
+        """Запускает фоновую пересборку (вызывается под self._lock)"""
+        self._changed = True
+        if self._rebuild_thread is None:
+            self._rebuild_thread = threading.Thread(
+                target=self._rebuild_loop, name='scanner-rebuild', daemon=True
+            )
+            self._rebuild_thread.start()
+
+    def _rebuild_loop(self) -> None:
+        """Пересобирает автомат, пока за время сборки список успевает измениться"""
+        while True:
+            with self._lock:
+                if not self._changed:
+                    self._rebuild_thread = None
+                    return
+                self._changed = False
+                keys = list(self._names)
+
+            automaton = Automaton.build(keys, self.ignore_case, self.whole_words)
+
+            with self._lock:
+                self._automaton, self._keys, self._base_keys = automaton, keys, set(keys)
+                self._delta_keys = [key for key in self._names if key not in self._base_keys]
+                self._delta = []
+
+    def _update_delta(self) -> None:
+        """
+        Дособирает дополнительные автоматы до всех ключей из _delta_keys
+        (вызывается под self._lock). Заполненные части остаются как есть,
+        пересобирается только последняя неполная: даже после массового
+        импорта все добавленные никнеймы ищутся до окончания фоновой пересборки.
+        """
+        covered = sum(len(delta_keys) for _, delta_keys in self._delta)
+        if covered == len(self._delta_keys):
+            return
+        if self._delta and len(self._delta[-1][1]) < DELTA_LIMIT:
+            covered -= len(self._delta.pop()[1])
+        while covered < len(self._delta_keys):
+            delta_keys = self._delta_keys[covered:covered + DELTA_LIMIT]
+            self._delta.append(
+                (Automaton.build(delta_keys, self.ignore_case, self.whole_words), delta_keys)
+            )
+            covered += len(delta_keys)
+
+    def wait_rebuilt(self, timeout: float = None) -> bool:
+        """Ждет окончания фоновой пересборки (для тестов и замеров)"""
+        thread = self._rebuild_thread
+        if thread is not None:
+            thread.join(timeout)
+        return self._rebuild_thread is None
+
+    def scan(self, text: str) -> List[Dict]:
+        """
+        Находит все вхождения никнеймов в тексте.
+        Возвращает список {'nickname', 'start', 'end'} в порядке появления.
+        """
+        with self._lock:
+            self._update_delta()
+            automaton, keys = self._automaton, self._keys
+            delta = list(self._delta)
+
+        hits = [(keys[index], start, end) for index, start, end in automaton.scan(text)]
+        for delta_automaton, delta_keys in delta:
+            hits += [(delta_keys[index], start, end) for index, start, end in delta_automaton.scan(text)]
+
+        matches = []
+        with self._lock:
+            for key, start, end in hits:
+                names = self._names.get(key)
+                # Ключ удален после сборки автомата
+                if names:
+                    matches.append({'nickname': next(iter(names)), 'start': start, 'end': end})
+
+        matches.sort(key=lambda m: (m['start'], -m['end']))
+        return matches
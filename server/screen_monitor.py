@@ -0,0 +1,781 @@
+# -*- coding: utf-8 -*-
+"""
+Монитор экрана: захват области, распознавание текста и поиск никнеймов
+
+Повторная работа OCR отсекается на двух уровнях:
+- кадр целиком сравнивается по перцептивному хэшу с предыдущим,
+  неизменившийся кадр не распознается;
+- изменившийся кадр режется на строки текста, и распознаются только строки,
+  которых нет в LRU-кэше (при прокрутке чата это лишь новые строки).
+
+Стадии захвата, OCR и сопоставления связаны ограниченными очередями
+(см. OcrPipeline), строки кадров распознаются пулом процессов, и в работе
+одновременно несколько кадров.
+
+Можно следить сразу за несколькими именованными областями (Config.OCR['REGIONS']):
+у каждой свой период захвата и настройки OCR, а пул процессов OCR, кэш строк
+и индекс никнеймов общие. Неизменившаяся область стоит только хэша кадра.
+Совпадения помечаются именем области (last_detected_source в БД).
+
+Список никнеймов берется из снимка Config.DATABASE['SNAPSHOT_PATH'] (mmap,
+без SQLite), если он есть; иначе - из БД. С БД монитор соединяется только
+для записи времени обнаружения при первом совпадении.
+
+Запуск:
+    python screen_monitor.py                  # живой экран (Config.OCR['REGIONS'] или SCREEN_REGION)
+    python screen_monitor.py --frames DIR     # записанные кадры из каталога
+    python screen_monitor.py --frames chat=DIR1 --frames game=DIR2
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import queue
+import shlex
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import pytesseract
+from PIL import Image, ImageChops, ImageFilter, ImageGrab, ImageOps, ImageStat
+
+from config import config
+import database
+import metrics
+from matcher import damerau_levenshtein
+from snapshot import SnapshotWatchlist
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.LOGGING['LEVEL'])
+
+pytesseract.pytesseract.tesseract_cmd = config.OCR['TESSERACT_PATH']
+
+# Имя источника, когда задана одна область без имени
+DEFAULT_SOURCE = 'screen'
+
+# Маркер конца потока в очереди распознанного текста
+_DONE = object()
+
+
+def dhash(image: Image.Image, hash_size: int = 16) -> int:
+    """Разностный перцептивный хэш изображения (hash_size * hash_size бит)"""
+    gray = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    """Число различающихся бит двух хэшей"""
+    return bin(a ^ b).count('1')
+
+
+def split_lines(gray: Image.Image, ink_threshold: int = None,
+                padding: int = 1) -> List[Tuple[int, int]]:
+    """
+    Делит изображение на строки текста по горизонтальной проекции:
+    строка - это непрерывная полоса рядов пикселей с контрастом выше порога.
+    Возвращает список (top, bottom).
+    """
+    ink_threshold = ink_threshold if ink_threshold is not None else config.OCR['INK_THRESHOLD']
+    width, height = gray.size
+    lines = []
+    top = None
+    for y in range(height):
+        low, high = gray.crop((0, y, width, y + 1)).getextrema()
+        has_ink = high - low > ink_threshold
+        if has_ink and top is None:
+            top = y
+        elif not has_ink and top is not None:
+            lines.append((max(0, top - padding), min(height, y + padding)))
+            top = None
+    if top is not None:
+        lines.append((max(0, top - padding), height))
+    return lines
+
+
+class OcrCache:
+    """LRU-кэш результатов OCR по хэшу содержимого строки"""
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or config.OCR['CACHE_SIZE']
+        self._items: 'OrderedDict[str, str]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> Optional[str]:
+        text = self._items.get(key)
+        if text is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        self._items[key] = text
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+
+def preprocess_line(line: Image.Image, target_height: int = None) -> Image.Image:
+    """
+    Готовит строку текста к OCR: оттенки серого, адаптивная бинаризация
+    (темный текст на белом фоне), обрезка по границам текста и
+    масштабирование к высоте, на которой Tesseract работает лучше всего.
+    """
+    target_height = target_height or config.OCR['TARGET_GLYPH_HEIGHT']
+    gray = line.convert('L')
+
+    # Светлый текст на темном фоне (типично для игровых чатов) инвертируем
+    if ImageStat.Stat(gray).mean[0] < 128:
+        gray = ImageOps.invert(gray)
+
+    # Адаптивный порог: пиксель - текст, если он темнее локального среднего
+    local_mean = gray.filter(ImageFilter.BoxBlur(config.OCR['THRESHOLD_RADIUS']))
+    offset = config.OCR['THRESHOLD_OFFSET']
+    ink = ImageChops.subtract(local_mean, gray).point(lambda v: 255 if v > offset else 0)
+
+    bbox = ink.getbbox()
+    if bbox is None:
+        return ImageOps.invert(ink)
+    ink = ink.crop(bbox)
+
+    if ink.height != target_height:
+        width = max(1, round(ink.width * target_height / ink.height))
+        ink = ink.resize((width, target_height), Image.LANCZOS).point(lambda v: 255 if v > 127 else 0)
+
+    # Белые поля вокруг текста улучшают распознавание
+    return ImageOps.expand(ImageOps.invert(ink), border=target_height // 4, fill=255)
+
+
+def choose_lang(charset: Set[str], lang: str = None) -> str:
+    """Убирает rus из языков OCR, если в никнеймах нет кириллицы"""
+    lang = lang or config.OCR['LANG']
+    langs = lang.split('+')
+    if 'eng' in langs and not any('\u0400' <= ch <= '\u04ff' for ch in charset):
+        return 'eng'
+    return lang
+
+
+def open_watchlist():
+    """Снимок никнеймов, если он доступен, иначе Database"""
+    path = config.DATABASE['SNAPSHOT_PATH']
+    if path and Path(path).exists():
+        try:
+            return SnapshotWatchlist(
+                path,
+                on_detect=lambda nicknames, source: database.db.record_detections(nicknames, source)
+            )
+        except (OSError, ValueError) as e:
+            logger.warning(f"Снимок никнеймов недоступен, используется БД: {str(e)}")
+    return database.db
+
+
+class TesseractOcr:
+    """
+    Распознавание строки через Tesseract.
+    Объект передается в процессы пула OCR, поэтому хранит только настройки.
+    """
+
+    def __init__(self, lang: str = None, psm: Optional[int] = None,
+                 whitelist: str = '', preprocess: bool = None):
+        self.lang = lang or config.OCR['LANG']
+        self.psm = psm if psm is not None else config.OCR['PSM']
+        self.whitelist = whitelist
+        self.preprocess = preprocess if preprocess is not None else config.OCR['PREPROCESS']
+
+    @classmethod
+    def from_watchlist(cls, watchlist=None) -> 'TesseractOcr':
+        """Настраивает язык и белый список символов по отслеживаемым никнеймам"""
+        if watchlist is None:
+            watchlist = open_watchlist()
+        charset = watchlist.get_charset()
+        if not charset or not config.OCR['USE_WHITELIST']:
+            return cls()
+        charset |= set(config.OCR['WHITELIST_EXTRA'])
+        charset.discard(' ')
+        return cls(lang=choose_lang(charset), whitelist=''.join(sorted(charset)))
+
+    def with_options(self, **options) -> 'TesseractOcr':
+        """Копия с переопределенными lang, psm или preprocess (для отдельной области)"""
+        settings = {'lang': self.lang, 'psm': self.psm,
+                    'whitelist': self.whitelist, 'preprocess': self.preprocess}
+        settings.update(options)
+        return TesseractOcr(**settings)
+
+    @property
+    def cache_key(self) -> str:
+        """Настройки, влияющие на результат: строки с разными настройками кэшируются отдельно"""
+        return f"{self.lang}|{self.preprocess}|{self.tesseract_config()}"
+
+    def tesseract_config(self) -> str:
+        options = []
+        if self.psm:
+            options.append(f"--psm {self.psm}")
+        if self.whitelist:
+            options.append(f"-c tessedit_char_whitelist={shlex.quote(self.whitelist)}")
+        return ' '.join(options)
+
+    def __call__(self, image: Image.Image) -> str:
+        if self.preprocess:
+            image = preprocess_line(image)
+        return pytesseract.image_to_string(image, lang=self.lang, config=self.tesseract_config())
+
+
+class PendingFrame:
+    """Кадр, часть строк которого еще распознается"""
+
+    def __init__(self, keys: List[str], texts: List[Optional[str]], futures: Dict[str, Future]):
+        self.keys = keys
+        self.texts = texts
+        # Только строки, которых не было в кэше
+        self.futures = futures
+        self.submitted_at = time.perf_counter()
+
+    def done(self) -> bool:
+        return all(future.done() for future in self.futures.values())
+
+
+class FrameProcessor:
+    """
+    Превращает кадр в текст, распознавая только изменившиеся строки.
+    submit() отправляет новые строки кадра в executor и не ждет их, finish()
+    собирает текст; process() делает и то и другое сразу.
+    """
+
+    def __init__(self, ocr: Callable[[Image.Image], str] = None,
+                 cache: OcrCache = None,
+                 executor: Executor = None,
+                 source: str = DEFAULT_SOURCE,
+                 in_flight: Dict[str, Future] = None):
+        self.ocr = ocr or TesseractOcr()
+        # Пул для распознавания строк; без него строки распознаются в вызывающем потоке
+        self.executor = executor
+        # Кэш может быть общим для нескольких областей с разными настройками OCR
+        self.cache = cache if cache is not None else OcrCache()
+        # Строки, которые уже распознаются: следующий кадр не отправляет их повторно
+        self.in_flight = in_flight if in_flight is not None else {}
+        self._cache_prefix = getattr(self.ocr, 'cache_key', '').encode('utf-8')
+        self.source = source
+        self._last_hash: Optional[int] = None
+        self._last_text = ''
+        self.frames = 0
+        self.skipped_frames = 0
+        self.ocr_calls = 0
+
+    def set_ocr(self, ocr: Callable[[Image.Image], str]) -> None:
+        """Меняет настройки OCR; текущий кадр будет распознан заново"""
+        self.ocr = ocr
+        self._cache_prefix = getattr(ocr, 'cache_key', '').encode('utf-8')
+        self._last_hash = None
+
+    def _recognize_line(self, line: Image.Image) -> Future:
+        if self.executor is not None:
+            return self.executor.submit(self.ocr, line)
+        future = Future()
+        try:
+            future.set_result(self.ocr(line))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def submit(self, image: Image.Image) -> Optional[PendingFrame]:
+        """
+        Отправляет на OCR строки кадра, которых нет в кэше.
+        Для неизменившегося кадра возвращает None, OCR не вызывается вовсе.
+        """
+        self.frames += 1
+        gray = image.convert('L')
+
+        frame_hash = dhash(gray, config.OCR['HASH_SIZE'])
+        if (self._last_hash is not None
+                and hamming(frame_hash, self._last_hash) <= config.OCR['HASH_THRESHOLD']):
+            self.skipped_frames += 1
+            return None
+        self._last_hash = frame_hash
+
+        texts: List[Optional[str]] = []
+        keys = []
+        futures: Dict[str, Future] = {}
+        for top, bottom in split_lines(gray):
+            line = gray.crop((0, top, gray.width, bottom))
+            key = hashlib.blake2b(self._cache_prefix + line.tobytes(), digest_size=16).hexdigest()
+            keys.append(key)
+            texts.append(None)
+            if key in futures:
+                continue
+            if key in self.in_flight:
+                # Строка уже распознается для предыдущего кадра - тоже попадание в кэш
+                self.cache.hits += 1
+                futures[key] = self.in_flight[key]
+                continue
+            texts[-1] = self.cache.get(key)
+            if texts[-1] is None:
+                futures[key] = self.in_flight[key] = self._recognize_line(line)
+                self.ocr_calls += 1
+        return PendingFrame(keys, texts, futures)
+
+    def finish(self, frame: PendingFrame) -> str:
+        """Дожидается строк кадра и возвращает его текст"""
+        recognized = {}
+        try:
+            for key, future in frame.futures.items():
+                recognized[key] = future.result().strip()
+        except Exception:
+            for key in frame.futures:
+                self.in_flight.pop(key, None)
+            # Кадр не распознан: такой же следующий кадр не должен отсеяться по хэшу
+            self._last_hash = None
+            raise
+
+        for key, text in recognized.items():
+            self.cache.put(key, text)
+            self.in_flight.pop(key, None)
+        if frame.futures:
+            metrics.OCR_SECONDS.observe(time.perf_counter() - frame.submitted_at, source=self.source)
+
+        lookups = self.cache.hits + self.cache.misses
+        if lookups:
+            metrics.OCR_CACHE_HIT_RATIO.set(self.cache.hits / lookups)
+
+        texts = [
+            text if text is not None else recognized[key]
+            for key, text in zip(frame.keys, frame.texts)
+        ]
+        self._last_text = '\n'.join(text for text in texts if text)
+        return self._last_text
+
+    def process(self, image: Image.Image) -> Tuple[str, bool]:
+        """
+        Возвращает (текст кадра, изменился ли кадр).
+        Для неизменившегося кадра OCR не вызывается вовсе.
+        """
+        frame = self.submit(image)
+        if frame is None:
+            return self._last_text, False
+        return self.finish(frame), True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'frames': self.frames,
+            'skipped_frames': self.skipped_frames,
+            'ocr_calls': self.ocr_calls,
+            'cache_hits': self.cache.hits,
+            'cache_size': len(self.cache)
+        }
+
+
+def screen_frames(region: Tuple[int, int, int, int],
+                  interval: float = None) -> Iterator[Image.Image]:
+    """Бесконечно захватывает область экрана (x, y, width, height)"""
+    interval = interval if interval is not None else config.OCR['INTERVAL']
+    x, y, width, height = region
+    while True:
+        started = time.monotonic()
+        yield ImageGrab.grab(bbox=(x, y, x + width, y + height))
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+class DetectionSource:
+    """Именованный поток кадров (область экрана или каталог) с настройками OCR"""
+
+    def __init__(self, name: str, frames: Iterator[Image.Image], ocr_options: Dict = None):
+        self.name = name
+        self.frames = frames
+        # Переопределения TesseractOcr для этого источника: lang, psm, preprocess
+        self.ocr_options = ocr_options or {}
+
+
+def parse_regions(value: str) -> Dict[str, Dict]:
+    """
+    Разбирает JSON областей OCR_REGIONS: {имя: {"region": [x, y, width, height], ...}}.
+    При ошибке бросает ValueError с указанием области.
+    """
+    if not value or not value.strip():
+        return {}
+    try:
+        regions = json.loads(value)
+    except ValueError as e:
+        raise ValueError(f"OCR_REGIONS: некорректный JSON ({str(e)})") from None
+    if not isinstance(regions, dict):
+        raise ValueError("OCR_REGIONS: ожидается объект {имя: настройки области}")
+
+    for name, settings in regions.items():
+        region = settings.get('region') if isinstance(settings, dict) else None
+        if (not isinstance(region, list) or len(region) != 4
+                or not all(isinstance(v, int) and not isinstance(v, bool) for v in region)):
+            raise ValueError(
+                f"OCR_REGIONS: у области {name!r} нужен region [x, y, width, height]"
+            )
+        interval = settings.get('interval')
+        if interval is not None and (not isinstance(interval, (int, float)) or interval <= 0):
+            raise ValueError(f"OCR_REGIONS: у области {name!r} interval должен быть > 0")
+    return regions
+
+
+def region_sources(regions: Dict[str, Dict] = None) -> List[DetectionSource]:
+    """Источники из Config.OCR['REGIONS'], а без них - одна область SCREEN_REGION"""
+    regions = regions if regions is not None else parse_regions(config.OCR['REGIONS'])
+    if not regions and config.OCR['SCREEN_REGION']:
+        regions = {DEFAULT_SOURCE: {'region': config.OCR['SCREEN_REGION']}}
+
+    sources = []
+    for name, settings in regions.items():
+        sources.append(DetectionSource(
+            name,
+            screen_frames(tuple(settings['region']), settings.get('interval')),
+            {key: settings[key] for key in ('lang', 'psm', 'preprocess') if key in settings}
+        ))
+    return sources
+
+
+def directory_frames(path: str) -> Iterator[Image.Image]:
+    """Читает записанные кадры из каталога в порядке имен файлов"""
+    for frame_path in sorted(Path(path).iterdir()):
+        if frame_path.suffix.lower() in ('.png', '.jpg', '.jpeg', '.bmp'):
+            with Image.open(frame_path) as image:
+                image.load()
+                yield image
+
+
+class OcrPipeline:
+    """
+    Конвейер захват -> OCR -> сопоставление.
+    Каждый источник захватывается в своем потоке, OCR и сопоставление -
+    по одному потоку на все источники; строки кадров распознаются
+    параллельно в общем пуле процессов. Поток OCR не ждет распознавания
+    кадра: в пуле одновременно до max_in_flight кадров, а текст каждого
+    источника выдается в порядке захвата, поэтому пул загружен, даже когда
+    в кадре одна-две новые строки, и медленная область не задерживает другие.
+    Очередь кадров у каждого источника своя и ограничена: если OCR не
+    успевает, самый старый кадр этого источника выбрасывается, и задержка
+    остается ограниченной. OCR берет кадры из очередей по кругу, поэтому
+    частый источник не вытесняет редкий.
+    """
+
+    def __init__(self, sources,
+                 ocr: Callable[[Image.Image], str] = None,
+                 workers: int = None, queue_size: int = None,
+                 executor: Executor = None,
+                 on_match: Callable[[Dict], None] = None,
+                 watchlist=None, max_in_flight: int = None):
+        if not isinstance(sources, (list, tuple)):
+            # Просто поток кадров - одна область без имени
+            sources = [DetectionSource(DEFAULT_SOURCE, sources)]
+        self.sources: List[DetectionSource] = list(sources)
+        # Любой объект со scan_text(), get_charset() и watchlist_version:
+        # Database или SnapshotWatchlist
+        self.watchlist = watchlist if watchlist is not None else open_watchlist()
+        # Язык и белый список по никнеймам пересчитываются, когда список меняется
+        self._auto_ocr = ocr is None
+        self._ocr_version = getattr(self.watchlist, 'watchlist_version', None)
+        self.ocr = ocr or TesseractOcr.from_watchlist(self.watchlist)
+        self.workers = workers or config.OCR['WORKERS']
+        self.max_in_flight = max_in_flight or config.OCR['MAX_IN_FLIGHT'] or 2 * self.workers
+        self.on_match = on_match or (lambda match: logger.info(
+            f"Найден никнейм: {match['nickname']} (источник: {match['source']})"
+        ))
+        self._executor = executor
+        self._own_executor = executor is None
+
+        self.queue_size = queue_size or config.OCR['QUEUE_SIZE']
+        self._frames: Dict[str, deque] = {source.name: deque() for source in self.sources}
+        self._frames_order = deque(self._frames)
+        self._frames_ready = threading.Condition()
+        self._finished_sources = 0
+        self._text_queue: 'queue.Queue' = queue.Queue(maxsize=self.queue_size * len(self.sources))
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        # Общий кэш строк: одинаковые строки в разных областях распознаются один раз
+        self.cache = OcrCache(config.OCR['CACHE_SIZE'] * len(self.sources))
+        self._in_flight_lines: Dict[str, Future] = {}
+        self.processors: Dict[str, FrameProcessor] = {}
+        self.captured: Dict[str, int] = {source.name: 0 for source in self.sources}
+        self.dropped = 0
+        self.matches = 0
+
+    def _put_latest(self, name: str, image: Image.Image) -> None:
+        """Кладет кадр в очередь источника, выбрасывая самый старый при переполнении"""
+        with self._frames_ready:
+            frames = self._frames[name]
+            if len(frames) >= self.queue_size:
+                frames.popleft()
+                self.dropped += 1
+            frames.append(image)
+            self._frames_ready.notify_all()
+
+    def _pop_frame(self) -> Optional[Tuple[str, Image.Image]]:
+        """Следующий кадр по кругу между источниками (вызывается под _frames_ready)"""
+        for _ in range(len(self._frames_order)):
+            name = self._frames_order[0]
+            self._frames_order.rotate(-1)
+            if self._frames[name]:
+                return name, self._frames[name].popleft()
+        return None
+
+    def _wake(self, future: Future = None) -> None:
+        """Будит поток OCR: появился кадр или распознана строка"""
+        with self._frames_ready:
+            self._frames_ready.notify_all()
+
+    def _capture(self, source: DetectionSource) -> None:
+        """Стадия 1: захват кадров одного источника"""
+        try:
+            for image in source.frames:
+                if self._stop.is_set():
+                    break
+                self.captured[source.name] += 1
+                self._put_latest(source.name, image)
+        except Exception as e:
+            logger.error(f"Ошибка захвата кадра ({source.name}): {str(e)}")
+        finally:
+            with self._frames_ready:
+                self._finished_sources += 1
+                self._frames_ready.notify_all()
+
+    def _emit_finished(self, in_flight: Dict[str, deque]) -> None:
+        """Передает на сопоставление распознанные кадры, соблюдая порядок в источнике"""
+        for name, frames in in_flight.items():
+            while frames and frames[0].done():
+                frame = frames.popleft()
+                try:
+                    text = self.processors[name].finish(frame)
+                except Exception as e:
+                    logger.error(f"Ошибка OCR ({name}): {str(e)}")
+                    continue
+                if text:
+                    self._text_queue.put((name, text))
+
+    def _recognize(self) -> None:
+        """Стадия 2: отсев неизменившихся кадров и параллельный OCR строк"""
+        in_flight: Dict[str, deque] = {source.name: deque() for source in self.sources}
+        try:
+            while True:
+                self._emit_finished(in_flight)
+                pending = sum(len(frames) for frames in in_flight.values())
+                with self._frames_ready:
+                    # Ждем новый кадр (если есть место в пуле) или распознанный кадр
+                    while True:
+                        item = self._pop_frame() if pending < self.max_in_flight else None
+                        if item is not None:
+                            break
+                        if any(frames and frames[0].done() for frames in in_flight.values()):
+                            break
+                        if not pending and self._finished_sources == len(self.sources):
+                            return
+                        self._frames_ready.wait()
+                if item is None:
+                    continue
+
+                name, image = item
+                try:
+                    self._refresh_ocr()
+                    frame = self.processors[name].submit(image)
+                except Exception as e:
+                    logger.error(f"Ошибка OCR ({name}): {str(e)}")
+                    continue
+                if frame is None:
+                    continue
+                in_flight[name].append(frame)
+                for future in frame.futures.values():
+                    future.add_done_callback(self._wake)
+        finally:
+            self._text_queue.put(_DONE)
+
+    def _source_ocr(self, source: DetectionSource) -> Callable[[Image.Image], str]:
+        """OCR с переопределениями источника"""
+        return self.ocr.with_options(**source.ocr_options) if source.ocr_options else self.ocr
+
+    def _refresh_ocr(self) -> None:
+        """
+        Пересчитывает язык и белый список OCR, если список никнеймов изменился
+        (например, добавлен первый кириллический никнейм). Ключ кэша строк
+        включает настройки, поэтому старые результаты не подмешиваются.
+        """
+        if not self._auto_ocr:
+            return
+        version = getattr(self.watchlist, 'watchlist_version', None)
+        if version is None or version == self._ocr_version:
+            return
+        self._ocr_version = version
+        ocr = TesseractOcr.from_watchlist(self.watchlist)
+        if ocr.cache_key == self.ocr.cache_key:
+            return
+        self.ocr = ocr
+        for source in self.sources:
+            self.processors[source.name].set_ocr(self._source_ocr(source))
+        logger.info(f"Настройки OCR обновлены по списку никнеймов: {ocr.lang}, {len(ocr.whitelist)} символов")
+
+    def _match(self) -> None:
+        """Стадия 3: поиск никнеймов в распознанном тексте"""
+        while True:
+            item = self._text_queue.get()
+            if item is _DONE:
+                break
+            name, text = item
+            try:
+                for match in self.watchlist.scan_text(text, name):
+                    match['source'] = name
+                    self.matches += 1
+                    self.on_match(match)
+            except Exception as e:
+                logger.error(f"Ошибка сопоставления: {str(e)}")
+
+    def start(self) -> 'OcrPipeline':
+        """Запускает стадии конвейера"""
+        if self._executor is None:
+            # Процессы OCR запускаются заново, а не форком: бот и монитор к этому
+            # моменту уже многопоточны, и форк мог бы унаследовать занятые блокировки
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        executor = self._executor
+        for source in self.sources:
+            self.processors[source.name] = FrameProcessor(
+                ocr=self._source_ocr(source),
+                cache=self.cache,
+                executor=executor,
+                source=source.name,
+                in_flight=self._in_flight_lines
+            )
+
+        stages = [(f'capture-{source.name}', partial(self._capture, source)) for source in self.sources]
+        stages += [('ocr', self._recognize), ('match', self._match)]
+        for name, target in stages:
+            thread = threading.Thread(target=target, name=f'pipeline-{name}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        """Просит захват остановиться; остальные стадии дорабатывают очередь"""
+        self._stop.set()
+
+    def join(self) -> None:
+        """Ждет завершения всех стадий и освобождает пул OCR"""
+        for thread in self._threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown()
+
+    def stats(self) -> Dict:
+        sources = {
+            name: {
+                'captured': self.captured[name],
+                'frames': processor.frames,
+                'skipped_frames': processor.skipped_frames,
+                'ocr_calls': processor.ocr_calls
+            }
+            for name, processor in self.processors.items()
+        }
+        stats = {
+            key: sum(source[key] for source in sources.values())
+            for key in ('captured', 'frames', 'skipped_frames', 'ocr_calls')
+        }
+        stats.update(cache_hits=self.cache.hits, cache_size=len(self.cache),
+                     dropped=self.dropped, matches=self.matches, sources=sources)
+        return stats
+
+
+def benchmark(path: str, variants: Dict[str, Callable[[Image.Image], str]] = None) -> Dict[str, Dict]:
+    """
+    Сравнивает варианты OCR на записанных кадрах с эталонным текстом.
+    Для кадра frame.png эталон лежит рядом в frame.txt.
+    Возвращает для каждого варианта время на кадр (мс) и точность по символам.
+    """
+    if variants is None:
+        line_ocr = TesseractOcr.from_watchlist()
+        variants = {
+            # Как в исходном примере: весь цветной кадр, rus+eng, без настроек
+            'raw': lambda image: pytesseract.image_to_string(image, lang=config.OCR['LANG']),
+            # Новый FrameProcessor на каждый кадр, чтобы кэш строк не влиял на замер
+            'preprocessed': lambda image: FrameProcessor(line_ocr).process(image)[0]
+        }
+
+    samples = []
+    for frame_path in sorted(Path(path).glob('*.png')):
+        truth_path = frame_path.with_suffix('.txt')
+        if truth_path.exists():
+            with Image.open(frame_path) as image:
+                image.load()
+            samples.append((image, truth_path.read_text(encoding='utf-8').strip()))
+
+    results = {}
+    for name, ocr in variants.items():
+        elapsed, errors, total = 0.0, 0, 0
+        for image, truth in samples:
+            started = time.perf_counter()
+            text = ocr(image)
+            elapsed += time.perf_counter() - started
+            text = ' '.join(text.split())
+            truth = ' '.join(truth.split())
+            errors += damerau_levenshtein(text, truth, max(len(text), len(truth)))
+            total += len(truth)
+
+        results[name] = {
+            'frames': len(samples),
+            'ms_per_frame': round(1000 * elapsed / max(len(samples), 1), 1),
+            'char_accuracy': round(1 - errors / total, 4) if total else None
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Монитор никнеймов на экране")
+    parser.add_argument('--frames', action='append', metavar='[NAME=]DIR',
+                        help="Каталог с записанными кадрами вместо экрана (можно несколько)")
+    parser.add_argument('--workers', type=int, help="Число процессов OCR")
+    parser.add_argument('--benchmark', metavar='DIR',
+                        help="Сравнить OCR с предобработкой и без на кадрах с эталонами *.txt")
+    args = parser.parse_args()
+    logging.basicConfig(level=config.LOGGING['LEVEL'], format=config.LOGGING['FORMAT'])
+
+    if args.benchmark:
+        for name, result in benchmark(args.benchmark).items():
+            print(f"{name:>14}: {result}")
+        return
+
+    if args.frames:
+        sources = []
+        for value in args.frames:
+            name, _, path = value.rpartition('=')
+            sources.append(DetectionSource(name or Path(path).name, directory_frames(path)))
+    else:
+        try:
+            sources = region_sources()
+        except ValueError as e:
+            parser.error(str(e))
+        if not sources:
+            parser.error("Не заданы области экрана OCR_REGIONS или OCR_SCREEN_REGION")
+
+    metrics.start_http_server(config.METRICS['MONITOR_PORT'])
+    pipeline = OcrPipeline(sources, workers=args.workers).start()
+    try:
+        pipeline.join()
+    except KeyboardInterrupt:
+        logger.info("Монитор остановлен")
+        pipeline.stop()
+        pipeline.join()
+    finally:
+        logger.info(f"Статистика: {pipeline.stats()}")
+
+
+if __name__ == '__main__':
+    main()
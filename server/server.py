@@ -1,7 +1,11 @@
-import sqlite3
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, Response, g, request, jsonify
 from datetime import datetime
 import logging
+from config import config
+from database import db
+import metrics
+import importer
 
 # Инициализация Flask-приложения
 app = Flask(__name__)
@@ -15,28 +19,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Конфигурация
-DATABASE_PATH = 'nicknames.db'
-API_KEYS = ['your-secret-key']  # Для авторизации клиентов
-
-def get_db_connection():
-    """Создает и возвращает соединение с базой данных"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row  # Доступ к колонкам по именам
-    return conn
-
-def init_db():
-    """Инициализация структуры базы данных"""
-    with get_db_connection() as conn:
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS nicknames (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nickname TEXT UNIQUE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                source TEXT DEFAULT 'manual'
-            )
-        ''')
-        conn.commit()
-    logger.info("База данных инициализирована")
+API_KEYS = config.API['KEYS']  # Для авторизации клиентов
 
 def validate_api_key():
     """Проверка API-ключа в заголовках запроса"""
@@ -46,43 +29,137 @@ def validate_api_key():
         return False
     return True
 
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    """Записывает длительность запроса в гистограмму http_request_seconds"""
+    started = g.pop('started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unknown'
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            endpoint=endpoint,
+            status=response.status_code
+        )
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Метрики в текстовом формате Prometheus"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/api/check', methods=['POST'])
 def check_nickname():
     """
     Проверяет наличие никнейма в базе
-    Пример запроса: {"nickname": "test_user"}
+    Пример запроса: {"nickname": "test_user", "mode": "fuzzy"}
+    Режим fuzzy учитывает ошибки OCR и возвращает найденный никнейм и расстояние
     """
     if not validate_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
 
-    data = request.get_json()
-    if not data or 'nickname' not in data:
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('nickname'), str):
         return jsonify({'error': 'Nickname is required'}), 400
 
     nickname = data['nickname'].strip()
-    logger.info(f"Проверка никнейма: {nickname}")
+    mode = data.get('mode', config.MATCHING['DEFAULT_MODE'])
+    if mode not in ('exact', 'fuzzy'):
+        return jsonify({'error': 'Mode must be exact or fuzzy'}), 400
+
+    logger.debug(f"Проверка никнейма: {nickname}")
 
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'SELECT * FROM nicknames WHERE nickname = ?',
-                (nickname,)
-            )
-            result = cursor.fetchone()
-
-        exists = bool(result)
-        logger.info(f"Результат проверки: {'найден' if exists else 'не найден'}")
-        return jsonify({
-            'exists': exists,
+        match = db.match_nickname(nickname, mode=mode)
+        logger.debug(f"Результат проверки: {'найден' if match else 'не найден'}")
+        response = {
+            'exists': match is not None,
             'nickname': nickname,
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        if match is not None:
+            response['matched'] = match['nickname']
+            response['distance'] = match['distance']
+        return jsonify(response)
 
     except Exception as e:
         logger.error(f"Ошибка при проверке: {str(e)}")
         return jsonify({'error': 'Database error'}), 500
 
+@app.route('/api/check/batch', methods=['POST'])
+def check_nicknames_batch():
+    """
+    Проверяет сразу несколько никнеймов (например, все строки одного кадра OCR)
+    Пример запроса: {"nicknames": ["user1", "user2"]}
+    """
+    if not validate_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('nicknames'), list):
+        return jsonify({'error': 'Nicknames list is required'}), 400
+
+    nicknames = data['nicknames']
+    if not all(isinstance(n, str) for n in nicknames):
+        return jsonify({'error': 'Nicknames must be strings'}), 400
+    if len(nicknames) > config.API['MAX_BATCH_SIZE']:
+        return jsonify({'error': 'Too many nicknames'}), 413
+
+    logger.debug(f"Пакетная проверка: {len(nicknames)} никнеймов")
+
+    try:
+        results = db.check_nicknames(nicknames)
+        matches = [nickname for nickname, exists in results.items() if exists]
+        logger.debug(f"Найдено совпадений: {len(matches)}")
+        return jsonify({
+            'results': results,
+            'matches': matches,
+            'timestamp': datetime.now().isoformat()
+        })
+
+    except Exception as e:
+        logger.error(f"Ошибка при пакетной проверке: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
+
+@app.route('/api/scan', methods=['POST'])
+def scan_text():
+    """
+    Ищет все отслеживаемые никнеймы в тексте кадра OCR
+    Пример запроса: {"text": "Player One: привет\nExampleUser: hi", "source": "chat"}
+    """
+    if not validate_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('text'), str):
+        return jsonify({'error': 'Text is required'}), 400
+
+    text = data['text']
+    if len(text) > config.API['MAX_SCAN_TEXT_LENGTH']:
+        return jsonify({'error': 'Text is too long'}), 413
+    source = data.get('source')
+    if source is not None and not isinstance(source, str):
+        return jsonify({'error': 'Source must be a string'}), 400
+
+    logger.debug(f"Поиск в тексте: {len(text)} символов")
+
+    try:
+        matches = db.scan_text(text, source)
+        nicknames = list(dict.fromkeys(m['nickname'] for m in matches))
+        logger.debug(f"Найдено совпадений: {len(matches)}")
+        return jsonify({
+            'matches': matches,
+            'nicknames': nicknames,
+            'timestamp': datetime.now().isoformat()
+        })
+
+    except Exception as e:
+        logger.error(f"Ошибка при поиске в тексте: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
+
 @app.route('/api/add', methods=['POST'])
 def add_nickname():
     """
@@ -92,21 +169,26 @@ def add_nickname():
     if not validate_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
 
-    data = request.get_json()
-    if not data or 'nickname' not in data:
+    data = request.get_json(silent=True)
+    nickname = data.get('nickname') if isinstance(data, dict) else None
+    if not isinstance(nickname, str) or not nickname.strip():
         return jsonify({'error': 'Nickname is required'}), 400
 
-    nickname = data['nickname'].strip()
-    source = data.get('source', 'manual')
+    nickname = nickname.strip()
+    source = data.get('source')
+    if source is None:
+        source = 'manual'
+    elif not isinstance(source, str):
+        return jsonify({'error': 'Source must be a string'}), 400
     logger.info(f"Добавление никнейма: {nickname}")
 
+    if db.is_tracked(nickname):
+        logger.warning("Попытка добавить существующий никнейм")
+        return jsonify({'error': 'Nickname already exists'}), 400
+
     try:
-        with get_db_connection() as conn:
-            conn.execute(
-                'INSERT INTO nicknames (nickname, source) VALUES (?, ?)',
-                (nickname, source)
-            )
-            conn.commit()
+        if not db.add_nickname(nickname, source=source):
+            return jsonify({'error': 'Database error'}), 500
 
         logger.info("Никнейм успешно добавлен")
         return jsonify({
@@ -115,37 +197,163 @@ def add_nickname():
             'source': source
         }), 201
 
-    except sqlite3.IntegrityError:
-        logger.warning("Попытка добавить существующий никнейм")
-        return jsonify({'error': 'Nickname already exists'}), 400
     except Exception as e:
         logger.error(f"Ошибка при добавлении: {str(e)}")
         return jsonify({'error': 'Database error'}), 500
 
 @app.route('/api/list', methods=['GET'])
 def list_nicknames():
-    """Возвращает список всех никнеймов"""
+    """
+    Возвращает страницу никнеймов (новые первыми)
+    Параметры: ?cursor=<id>&limit=<n>&direction=next|prev
+    Параметр ?all=1 включает деактивированные
+    """
     if not validate_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
 
+    active_only = request.args.get('all', '0') != '1'
+    direction = request.args.get('direction', 'next')
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM nicknames ORDER BY created_at DESC')
-            nicknames = [dict(row) for row in cursor.fetchall()]
+        cursor = int(request.args['cursor']) if request.args.get('cursor') else None
+        limit = int(request.args.get('limit', config.API['PAGE_SIZE']))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    if direction not in ('next', 'prev'):
+        return jsonify({'error': 'Direction must be next or prev'}), 400
+    limit = max(1, min(limit, config.API['MAX_PAGE_SIZE']))
 
-        logger.info(f"Возвращено {len(nicknames)} никнеймов")
-        return jsonify({'nicknames': nicknames})
+    try:
+        page = db.get_nicknames_page(cursor, limit, active_only, direction)
+
+        logger.debug(f"Возвращено {len(page['nicknames'])} никнеймов")
+        return jsonify(page)
 
     except Exception as e:
         logger.error(f"Ошибка при получении списка: {str(e)}")
         return jsonify({'error': 'Database error'}), 500
 
+def parse_stats_days():
+    """Параметр ?days=<n> (по умолчанию TELEGRAM STATS_DAYS) или None, если он некорректен"""
+    try:
+        days = int(request.args.get('days', config.TELEGRAM['STATS_DAYS']))
+    except ValueError:
+        return None
+    if not 1 <= days <= config.API['MAX_STATS_DAYS']:
+        return None
+    return days
+
+@app.route('/api/stats', methods=['GET'])
+def detection_stats():
+    """
+    Статистика обнаружений никнейма по сводкам
+    Параметры: ?nickname=<никнейм>&days=<n>
+    """
+    if not validate_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+
+    nickname = request.args.get('nickname', '').strip()
+    if not nickname:
+        return jsonify({'error': 'Nickname is required'}), 400
+    days = parse_stats_days()
+    if days is None:
+        return jsonify({'error': f"Days must be between 1 and {config.API['MAX_STATS_DAYS']}"}), 400
+
+    try:
+        return jsonify(db.get_detection_stats(nickname, days))
+    except Exception as e:
+        logger.error(f"Ошибка при получении статистики: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
+
+@app.route('/api/stats/top', methods=['GET'])
+def top_detected():
+    """
+    Чаще всего обнаруживаемые никнеймы
+    Параметры: ?days=<n>&limit=<n>
+    """
+    if not validate_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+
+    days = parse_stats_days()
+    if days is None:
+        return jsonify({'error': f"Days must be between 1 and {config.API['MAX_STATS_DAYS']}"}), 400
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    limit = max(1, min(limit, config.API['MAX_PAGE_SIZE']))
+
+    try:
+        return jsonify({'days': days, 'nicknames': db.get_top_detected(days, limit)})
+    except Exception as e:
+        logger.error(f"Ошибка при получении топа обнаружений: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
+
+@app.route('/api/export', methods=['GET'])
+def export_nicknames():
+    """
+    Потоково выгружает все никнеймы
+    Параметры: ?format=ndjson|csv (по умолчанию ndjson), ?all=1 включает деактивированные
+    """
+    if not validate_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in importer.FORMATS:
+        return jsonify({'error': 'Format must be csv or ndjson'}), 400
+
+    active_only = request.args.get('all', '0') != '1'
+    logger.info(f"Выгрузка никнеймов ({fmt})")
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(importer.export_lines(fmt, active_only), mimetype=mimetype)
+
+@app.route('/api/import', methods=['POST'])
+def import_nicknames():
+    """
+    Массово импортирует никнеймы из тела запроса (CSV или NDJSON)
+    Параметры: ?format=csv|ndjson, ?source=<источник по умолчанию>
+    """
+    if not validate_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+
+    default_fmt = 'ndjson' if 'ndjson' in (request.content_type or '') else 'csv'
+    fmt = request.args.get('format', default_fmt)
+    if fmt not in importer.FORMATS:
+        return jsonify({'error': 'Format must be csv or ndjson'}), 400
+
+    source = request.args.get('source', 'import')
+    logger.info(f"Импорт никнеймов ({fmt})")
+
+    try:
+        counts = importer.import_bytes(request.stream, fmt, source)
+        return jsonify({'status': 'success', **counts})
+
+    except UnicodeDecodeError:
+        return jsonify({'error': 'File must be UTF-8'}), 400
+    except Exception as e:
+        logger.error(f"Ошибка при импорте: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
+
 if __name__ == '__main__':
-    init_db()
-    app.run(
-        host='0.0.0.0',
-        port=5000,
-        debug=True,
-        threaded=True  # Для обработки нескольких запросов одновременно
-    )
+    db.migrate_legacy_db()
+    if config.API['ENGINE'] == 'asgi':
+        # Продакшен-режим: ASGI-приложение в нескольких процессах uvicorn
+        import uvicorn
+
+        uvicorn.run(
+            'asgi:app',
+            host=config.API['HOST'],
+            port=config.API['PORT'],
+            workers=config.API['WORKERS'],
+            log_level='warning'
+        )
+    else:
+        # Как и в asgi.py: индекс сверяется с БД фоновым потоком, а не
+        # перестраивается внутри запроса, который первым заметил изменение
+        db.start_watchlist_refresh()
+        app.run(
+            host=config.API['HOST'],
+            port=config.API['PORT'],
+            debug=config.API['DEBUG'],
+            threaded=True  # Для обработки нескольких запросов одновременно
+        )
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Компактный снимок списка активных никнеймов для быстрого старта детектора
+
+Формат файла (все числа little-endian, массивы - uint32):
+    заголовок   magic(8) version(8) created_at(8) count(4) charset_len(4) blob_len(8)
+                nodes(4) edges(4) flags(4)
+    offsets     count + 1 смещений никнеймов в blob
+    автомат     массивы Ахо-Корасик (scanner.AUTOMATON_ARRAYS): edge_start
+                (nodes + 1), edge_chars и edge_targets (edges), fail, output,
+                terminal и depth (nodes); terminal - номер никнейма + 1
+    charset     UTF-8 символы всех никнеймов (для белого списка Tesseract)
+    blob        никнеймы в UTF-8, отсортированные по байтам, без разделителей
+
+Файл открывается через mmap только для чтения, массивы читаются прямо из
+отображенных страниц: проверка наличия - двоичный поиск по смещениям, поиск
+по тексту кадра идет автоматом из файла. Ни список, ни автомат не копируются
+в память процесса, несколько процессов детектора на одной машине разделяют
+одни и те же страницы кэша ОС. Поиск по тексту использует флаги ignore_case и
+whole_words, с которыми снимок записан. version - хэш содержимого и флагов:
+одинаковые списки дают одинаковую версию.
+
+Снимок пишется атомарно (временный файл + os.replace), поэтому читатели
+никогда не видят частично записанный файл.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Union
+
+from config import config
+from scanner import AUTOMATON_ARRAYS, Automaton
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.LOGGING['LEVEL'])
+
+MAGIC = b'NKSNAP02'
+_HEADER = struct.Struct('<8sQdIIQIII')
+_UINT32 = 4
+
+# Биты поля flags
+FLAG_IGNORE_CASE = 1
+FLAG_WHOLE_WORDS = 2
+
+
+def _array_sizes(count: int, nodes: int, edges: int) -> List[int]:
+    """Длины массивов uint32 в порядке записи: offsets и массивы автомата"""
+    sizes = {'edge_start': nodes + 1, 'edge_chars': edges, 'edge_targets': edges}
+    return [count + 1] + [sizes.get(name, nodes) for name in AUTOMATON_ARRAYS]
+
+
+def _to_bytes(values: Sequence[int]) -> bytes:
+    data = array('I', values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+def write_snapshot(path: Union[str, Path], nicknames: Iterable[str],
+                   ignore_case: bool = None, whole_words: bool = None) -> Dict:
+    """
+    Записывает снимок никнеймов в path (атомарно).
+    Возвращает {'path', 'count', 'version', 'bytes'}.
+    """
+    path = Path(path)
+    ignore_case = ignore_case if ignore_case is not None else config.MATCHING['SCAN_IGNORE_CASE']
+    whole_words = whole_words if whole_words is not None else config.MATCHING['SCAN_WHOLE_WORDS']
+    flags = (FLAG_IGNORE_CASE if ignore_case else 0) | (FLAG_WHOLE_WORDS if whole_words else 0)
+
+    encoded = sorted({nickname.encode('utf-8') for nickname in nicknames if nickname})
+    charset = ''.join(sorted(set(b''.join(encoded).decode('utf-8')))).encode('utf-8')
+    # Номера слов автомата совпадают с номерами никнеймов в таблице
+    automaton = Automaton.build([name.decode('utf-8') for name in encoded], ignore_case, whole_words)
+
+    offsets = [0]
+    for name in encoded:
+        offsets.append(offsets[-1] + len(name))
+    blob = b''.join(encoded)
+    digest = hashlib.blake2b(bytes([flags]) + b'\0'.join(encoded), digest_size=8).digest()
+    version = int.from_bytes(digest, 'little')
+
+    header = _HEADER.pack(MAGIC, version, time.time(), len(encoded), len(charset), len(blob),
+                          automaton.nodes, automaton.edges, flags)
+    arrays = automaton.arrays()
+    body = [header, _to_bytes(offsets)]
+    body += [_to_bytes(arrays[name]) for name in AUTOMATON_ARRAYS]
+    body += [charset, blob]
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=path.name, suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for part in body:
+                f.write(part)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+    size = sum(len(part) for part in body)
+    logger.debug(f"Снимок никнеймов записан: {path} ({len(encoded)}, {size} байт)")
+    return {'path': str(path), 'count': len(encoded), 'version': version, 'bytes': size}
+
+
+class WatchlistSnapshot:
+    """Снимок никнеймов, открытый через mmap (только чтение)"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._stat = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._views: List[memoryview] = []
+        try:
+            (magic, self.version, self.created_at, self.count, charset_len, blob_len,
+             nodes, edges, flags) = _HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC:
+                raise ValueError(f"Неизвестный формат снимка: {self.path}")
+            sizes = _array_sizes(self.count, nodes, edges)
+            charset_start = _HEADER.size + _UINT32 * sum(sizes)
+            self._blob_start = charset_start + charset_len
+            if self._blob_start + blob_len != len(self._mm):
+                raise ValueError(f"Снимок поврежден: {self.path}")
+            self.charset = self._mm[charset_start:self._blob_start].decode('utf-8')
+
+            arrays = []
+            position = _HEADER.size
+            for size in sizes:
+                arrays.append(self._uint32_array(position, size))
+                position += _UINT32 * size
+            self._offsets = arrays[0]
+            self.automaton = Automaton(
+                dict(zip(AUTOMATON_ARRAYS, arrays[1:])),
+                ignore_case=bool(flags & FLAG_IGNORE_CASE),
+                whole_words=bool(flags & FLAG_WHOLE_WORDS)
+            )
+        except Exception:
+            self._release()
+            raise
+
+    def _uint32_array(self, start: int, size: int) -> Sequence[int]:
+        """Массив uint32 из файла без копирования (на big-endian - копия)"""
+        view = memoryview(self._mm)[start:start + _UINT32 * size]
+        self._views.append(view)
+        if sys.byteorder != 'little':
+            data = array('I', view.tobytes())
+            data.byteswap()
+            return data
+        values = view.cast('I')
+        self._views.append(values)
+        return values
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _entry(self, index: int) -> bytes:
+        return self._mm[self._blob_start + self._offsets[index]:self._blob_start + self._offsets[index + 1]]
+
+    def nickname(self, index: int) -> str:
+        return self._entry(index).decode('utf-8')
+
+    def __contains__(self, nickname: str) -> bool:
+        key = nickname.encode('utf-8')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry = self._entry(middle)
+            if entry < key:
+                low = middle + 1
+            elif entry > key:
+                high = middle
+            else:
+                return True
+        return False
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(self.count):
+            yield self.nickname(index)
+
+    def scan(self, text: str) -> List[Dict]:
+        """
+        Находит все вхождения никнеймов в тексте автоматом из файла.
+        Возвращает список {'nickname', 'start', 'end'} в порядке появления.
+        """
+        matches = [
+            {'nickname': self.nickname(index), 'start': start, 'end': end}
+            for index, start, end in self.automaton.scan(text)
+        ]
+        matches.sort(key=lambda m: (m['start'], -m['end']))
+        return matches
+
+    def is_current(self) -> bool:
+        """Не заменен ли файл на диске новой версией"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return True
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size) == (
+            self._stat.st_ino, self._stat.st_mtime_ns, self._stat.st_size
+        )
+
+    def _release(self) -> None:
+        # mmap нельзя закрыть, пока на него ссылаются memoryview
+        self.automaton = None
+        self._offsets = None
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mm.close()
+
+    def close(self) -> None:
+        self._release()
+
+
+class SnapshotWatchlist:
+    """
+    Список наблюдения детектора поверх файла снимка вместо SQLite.
+    Повторяет интерфейс Database, нужный детектору (is_tracked, get_charset,
+    scan_text), и подхватывает новый снимок, когда файл на диске заменен.
+    """
+
+    def __init__(self, path: Union[str, Path], refresh_interval: float = None,
+                 on_detect: Callable[[List[str], Optional[str]], None] = None):
+        self.path = Path(path)
+        self.refresh_interval = (
+            refresh_interval if refresh_interval is not None
+            else config.DATABASE['WATCHLIST_REFRESH_INTERVAL']
+        )
+        self.on_detect = on_detect
+        self._lock = threading.Lock()
+        self._checked_at = time.monotonic()
+        self._snapshot = WatchlistSnapshot(self.path)
+        logger.info(
+            f"Загружен снимок никнеймов {self.path}: {len(self._snapshot)}, "
+            f"версия {self._snapshot.version:016x}"
+        )
+
+    @property
+    def watchlist_version(self) -> int:
+        """Версия текущего снимка (см. Database.watchlist_version)"""
+        self._refresh_if_changed()
+        return self._snapshot.version
+
+    def _refresh_if_changed(self) -> None:
+        """Переоткрывает снимок, если файл заменен (не чаще refresh_interval)"""
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            if self._snapshot.is_current():
+                return
+            try:
+                snapshot = WatchlistSnapshot(self.path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Ошибка загрузки снимка никнеймов: {str(e)}")
+                return
+            # Старый mmap закроется сборщиком мусора, когда его перестанут читать
+            self._snapshot = snapshot
+        logger.info(f"Снимок никнеймов обновлен: {len(snapshot)}, версия {snapshot.version:016x}")
+
+    def is_tracked(self, nickname: str) -> bool:
+        self._refresh_if_changed()
+        return nickname.strip() in self._snapshot
+
+    def get_charset(self) -> Set[str]:
+        self._refresh_if_changed()
+        return set(self._snapshot.charset)
+
+    def scan_text(self, text: str, source: Optional[str] = None) -> List[Dict]:
+        """Находит отслеживаемые никнеймы в тексте (см. Database.scan_text)"""
+        self._refresh_if_changed()
+        matches = self._snapshot.scan(text)
+        if matches and self.on_detect is not None:
+            self.on_detect(list({m['nickname'] for m in matches}), source)
+        return matches
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Общие фикстуры тестов. Модули сервера импортируются по короткому имени
+(from config import config), поэтому каталог server/ добавляется в sys.path.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import config  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Отдельная БД во временном каталоге, без снимка для детекторов"""
+    monkeypatch.setitem(config.DATABASE, 'PATH', str(tmp_path / 'nicknames.db'))
+    monkeypatch.setitem(config.DATABASE, 'SNAPSHOT_PATH', '')
+    from database import Database
+
+    database = Database()
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def global_db(db, monkeypatch):
+    """
+    БД из фикстуры db в роли глобальных database.db и database.adb: модули
+    server.py, asgi.py и bot.py импортируют их при загрузке
+    """
+    import database
+
+    adb = database.AsyncDatabase(db)
+    monkeypatch.setattr(database, 'db', db, raising=False)
+    monkeypatch.setattr(database, 'adb', adb, raising=False)
+    yield db
+    adb.close()
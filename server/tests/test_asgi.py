@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""HTTP API на Starlette (asgi.py): тот же контракт, что и у server.py"""
+
+import pytest
+from starlette.testclient import TestClient
+
+from config import config
+
+HEADERS = {'X-API-KEY': config.API['KEYS'][0]}
+
+
+@pytest.fixture
+def client(global_db, tmp_path, monkeypatch):
+    import asgi
+    import database
+
+    monkeypatch.setitem(config.DATABASE, 'LEGACY_PATH', str(tmp_path / 'legacy.db'))
+    monkeypatch.setattr(asgi, 'db', global_db)
+    monkeypatch.setattr(asgi, 'adb', database.adb)
+    # Контекстный менеджер выполняет lifespan: миграцию и загрузку индекса
+    with TestClient(asgi.app) as client:
+        yield client
+
+
+def test_check_exact_and_fuzzy(client, global_db):
+    global_db.add_nickname('Alice')
+    response = client.post('/api/check', json={'nickname': ' Alice '}, headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json()['exists'] and response.json()['matched'] == 'Alice'
+
+    response = client.post('/api/check', json={'nickname': 'Alica', 'mode': 'fuzzy'}, headers=HEADERS)
+    assert response.json()['matched'] == 'Alice' and response.json()['distance'] == 1
+    assert not client.post('/api/check', json={'nickname': 'Bob'}, headers=HEADERS).json()['exists']
+
+
+@pytest.mark.parametrize('body', [['Alice'], 'Alice', {}, {'nickname': 5}])
+def test_check_rejects_malformed_body(client, body):
+    assert client.post('/api/check', json=body, headers=HEADERS).status_code == 400
+
+
+def test_check_rejects_bad_json_mode_and_key(client):
+    assert client.post('/api/check', content=b'{', headers=HEADERS).status_code == 400
+    response = client.post('/api/check', json={'nickname': 'Bob', 'mode': 'regex'}, headers=HEADERS)
+    assert response.status_code == 400
+    assert client.post('/api/check', json={'nickname': 'Bob'}).status_code == 401
+
+
+def test_add_validates_nickname_and_source(client, global_db):
+    response = client.post('/api/add', json={'nickname': ' Bob ', 'source': 'chat'}, headers=HEADERS)
+    assert response.status_code == 201
+    assert response.json() == {'status': 'success', 'nickname': 'Bob', 'source': 'chat'}
+    assert global_db.is_tracked('Bob')
+
+    assert client.post('/api/add', json={'nickname': 'Bob'}, headers=HEADERS).status_code == 400
+    for body in ({'nickname': '  '}, {'nickname': 'Eve', 'source': 5}, ['Eve']):
+        assert client.post('/api/add', json=body, headers=HEADERS).status_code == 400, body
+    assert client.post('/api/add', json={'nickname': 'Eve'}, headers=HEADERS).json()['source'] == 'manual'
+
+
+def test_list_pages_and_rejects_bad_params(client, global_db):
+    for i in range(3):
+        global_db.add_nickname(f'player{i}')
+    page = client.get('/api/list?limit=2', headers=HEADERS).json()
+    assert [row['nickname'] for row in page['nicknames']] == ['player2', 'player1']
+    page = client.get(f"/api/list?limit=2&cursor={page['next_cursor']}", headers=HEADERS).json()
+    assert [row['nickname'] for row in page['nicknames']] == ['player0']
+
+    for query in ('cursor=abc', 'limit=abc', 'direction=up'):
+        assert client.get(f'/api/list?{query}', headers=HEADERS).status_code == 400, query
+
+
+def test_requests_are_timed_by_route(client):
+    client.post('/api/check', json={'nickname': 'Bob'}, headers=HEADERS)
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert 'http_request_seconds_count{endpoint="/api/check",status="200"}' in response.text
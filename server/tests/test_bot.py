@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Страницы /list Telegram-бота (bot.py)"""
+
+import pytest
+
+
+@pytest.fixture
+def bot(global_db):
+    import bot as module
+
+    return module
+
+
+def page(nicknames, next_cursor=None, prev_cursor=None):
+    rows = [{'id': 100 - i, 'nickname': nickname} for i, nickname in enumerate(nicknames)]
+    return {'nicknames': rows, 'next_cursor': next_cursor, 'prev_cursor': prev_cursor}
+
+
+def test_short_page_is_unchanged(bot):
+    original = page(['Alice', 'Bob'], next_cursor=99)
+    text, fitted = bot.fit_list_page(original)
+    assert text == bot.LIST_HEADER + 'Alice\nBob'
+    assert fitted == original
+
+
+def test_next_page_is_cut_at_message_limit(bot):
+    names = [f'{i:02d}' + 'x' * 30 for i in range(10)]
+    text, fitted = bot.fit_list_page(page(names, prev_cursor=100), limit=120)
+    assert len(text) <= 120
+    kept = [row['nickname'] for row in fitted['nicknames']]
+    assert kept == names[:len(kept)] and 0 < len(kept) < len(names)
+    # Следующая страница начнется сразу после последнего показанного
+    assert fitted['next_cursor'] == fitted['nicknames'][-1]['id']
+    assert fitted['prev_cursor'] == 100
+
+
+def test_prev_page_keeps_rows_next_to_cursor(bot):
+    names = [f'{i:02d}' + 'x' * 30 for i in range(10)]
+    text, fitted = bot.fit_list_page(page(names, next_cursor=91), direction='prev', limit=120)
+    assert len(text) <= 120
+    kept = [row['nickname'] for row in fitted['nicknames']]
+    assert kept == names[-len(kept):] and len(kept) < len(names)
+    assert fitted['prev_cursor'] == fitted['nicknames'][0]['id']
+    assert fitted['next_cursor'] == 91
+
+
+def test_overlong_nickname_is_truncated_only_in_text(bot):
+    original = page(['y' * 500])
+    text, fitted = bot.fit_list_page(original, limit=100)
+    assert len(text) <= 100 and text.endswith('…')
+    assert fitted['nicknames'][0]['nickname'] == 'y' * 500
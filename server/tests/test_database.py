@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""Список никнеймов в SQLite (database.py)"""
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from config import config
+from database import TIMESTAMP_FORMAT
+
+
+def names(page):
+    return [row['nickname'] for row in page['nicknames']]
+
+
+@pytest.fixture
+def filled(db):
+    for i in range(7):
+        db.add_nickname(f'player{i}')
+    db.remove_nickname('player3')
+    return db
+
+
+def test_keyset_pagination_forward_and_back(filled):
+    first = filled.get_nicknames_page(limit=3)
+    assert names(first) == ['player6', 'player5', 'player4']
+    assert first['prev_cursor'] is None and first['next_cursor'] is not None
+
+    second = filled.get_nicknames_page(first['next_cursor'], limit=3)
+    # Деактивированный player3 пропущен
+    assert names(second) == ['player2', 'player1', 'player0']
+    assert second['next_cursor'] is None
+
+    back = filled.get_nicknames_page(second['prev_cursor'], limit=3, direction='prev')
+    assert names(back) == names(first)
+    assert back['prev_cursor'] is None and back['next_cursor'] == first['next_cursor']
+
+
+def test_pagination_includes_inactive_on_request(filled):
+    page = filled.get_nicknames_page(limit=10, active_only=False)
+    assert 'player3' in names(page) and page['next_cursor'] is None
+
+
+def test_pagination_rejects_unknown_direction(filled):
+    with pytest.raises(ValueError):
+        filled.get_nicknames_page(direction='sideways')
+
+
+def test_iter_nicknames_walks_all_pages(filled):
+    assert [row['nickname'] for row in filled.iter_nicknames(batch_size=2)] == [
+        'player6', 'player5', 'player4', 'player2', 'player1', 'player0'
+    ]
+
+
+def test_writes_update_index_and_version(db):
+    version = db.watchlist_version
+    assert db.add_nickname('Вася')
+    assert db.watchlist_version != version
+    assert db.get_charset() >= set('Вася')
+    assert [m['nickname'] for m in db.scan_text('Вася: привет')] == ['Вася']
+    assert db.match_nickname('Вася')['nickname'] == 'Вася'
+
+    assert db.remove_nickname('Вася')
+    assert not db.is_tracked('Вася')
+    assert db.scan_text('Вася: привет') == []
+
+
+def test_add_during_reload_survives_index_swap(db, monkeypatch):
+    db.add_nickname('early')
+    get_connection = db._get_connection
+    added = []
+
+    @contextmanager
+    def connection():
+        with get_connection() as conn:
+            yield conn
+        # Запись другого потока сразу после чтения списка перезагрузкой
+        if not added:
+            added.append(None)
+            added[0] = db.add_nickname('late')
+
+    monkeypatch.setattr(db, '_get_connection', connection)
+    # Как будто список изменил другой процесс
+    db._data_version = -1
+    db._load_watchlist()
+    monkeypatch.undo()
+
+    assert added == [True]
+    assert db.is_tracked('early') and db.is_tracked('late')
+
+
+def test_detections_coalesce_per_minute(db, monkeypatch):
+    import database
+
+    clock = iter(['12:00:05', '12:00:40', '12:00:59', '12:01:10'])
+
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.fromisoformat(f'2026-10-16 {next(clock)}').replace(tzinfo=timezone.utc)
+
+    db.add_nickname('Bob')
+    monkeypatch.setattr(database, 'datetime', FixedDatetime)
+    db.record_detections(['Bob'], 'chat')
+    db.record_detections(['Bob'], 'chat')
+    # Минута, начатая прошлым сбросом, дописывается в ту же строку
+    db.flush_detections()
+    db.record_detections(['Bob'], 'chat')
+    db.record_detections(['Bob'], 'chat')
+    db.flush_detections()
+
+    with db._get_connection() as conn:
+        rows = conn.execute(
+            "SELECT detected_at, count, first_seen, last_seen FROM detections ORDER BY detected_at"
+        ).fetchall()
+    assert [tuple(row) for row in rows] == [
+        ('2026-10-16 12:00:00', 3, '2026-10-16 12:00:05', '2026-10-16 12:00:59'),
+        ('2026-10-16 12:01:00', 1, '2026-10-16 12:01:10', '2026-10-16 12:01:10'),
+    ]
+
+
+def test_detection_stats_from_rollups(db):
+    db.add_nickname('Bob')
+    db.record_detections(['Bob'], 'chat')
+    db.record_detections(['Bob'], 'chat')
+    db.record_detections(['Bob'])
+    db.flush_detections()
+
+    stats = db.get_detection_stats(' Bob ', days=7)
+    assert stats['nickname'] == 'Bob' and stats['days'] == 7
+    assert stats['total'] == 3 and stats['last_24h'] == 3
+    assert stats['by_source'] == {'chat': 2, '': 1}
+    assert [day['count'] for day in stats['by_day']] == [3]
+    assert stats['last_seen'] is not None
+    assert db.get_top_detected(days=7) == [{'nickname': 'Bob', 'count': 3, 'last_seen': stats['last_seen']}]
+    assert db.get_detection_stats('Eve')['total'] == 0
+
+
+def test_prune_keeps_daily_rollups_and_recent_history(db):
+    now = datetime.now(timezone.utc)
+    old = (now - timedelta(days=config.DATABASE['DETECTION_RETENTION_DAYS'] + 1)).strftime(TIMESTAMP_FORMAT)
+    ancient = (now - timedelta(days=config.DATABASE['HOURLY_ROLLUP_RETENTION_DAYS'] + 1))
+    db.record_detections(['Bob'], 'chat')
+    db.flush_detections()
+    with db._get_connection() as conn:
+        for _ in range(3):
+            conn.execute("INSERT INTO detections (nickname, source, detected_at, count, first_seen, last_seen) "
+                         "VALUES ('Bob', 'chat', ?, 1, ?, ?)", (old, old, old))
+        for bucket, start in (('hour', ancient.strftime('%Y-%m-%d %H:00:00')),
+                              ('day', ancient.strftime('%Y-%m-%d 00:00:00'))):
+            conn.execute("INSERT INTO detection_rollups VALUES ('Bob', ?, ?, 'chat', 1, ?, ?)",
+                         (bucket, start, start, start))
+        conn.commit()
+
+    # Порции меньше числа устаревших событий: удаление идет в несколько проходов
+    assert db.prune_detections(batch_size=2) == 4
+    with db._get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM detections").fetchone()[0] == 1
+        buckets = sorted(row[0] for row in conn.execute("SELECT bucket FROM detection_rollups"))
+    # Осталась старая дневная сводка и обе сводки свежего события
+    assert buckets == ['day', 'day', 'hour']
+
+
+def test_close_flushes_buffered_detections(db, monkeypatch):
+    from database import Database
+
+    monkeypatch.setitem(config.DATABASE, 'DETECTION_FLUSH_INTERVAL', 60.0)
+    db.add_nickname('Bob')
+    db.record_detections(['Bob'], 'chat')
+    db.close()
+
+    reopened = Database()
+    try:
+        assert reopened.get_detection_stats('Bob')['total'] == 1
+        with reopened._get_connection() as conn:
+            row = conn.execute("SELECT last_detected_source FROM tracked_nicknames WHERE nickname = 'Bob'").fetchone()
+        assert row[0] == 'chat'
+    finally:
+        reopened.close()
+
+
+def test_full_buffer_is_flushed_without_waiting_for_interval(db, monkeypatch):
+    monkeypatch.setitem(config.DATABASE, 'DETECTION_FLUSH_INTERVAL', 60.0)
+    monkeypatch.setitem(config.DATABASE, 'DETECTION_FLUSH_SIZE', 3)
+    db.record_detections(['Bob', 'Eve'], 'chat')
+    assert db._pending_events
+
+    db.record_detections(['Mallory'], 'chat')
+    deadline = time.monotonic() + 5
+    while db._pending_events and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with db._get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM detections").fetchone()[0] == 3
+
+
+def test_pool_hands_each_thread_its_own_connection(tmp_path):
+    from database import ConnectionPool
+
+    pool = ConnectionPool(tmp_path / 'pool.db', max_size=3, timeout=5, pragmas={})
+    barrier = threading.Barrier(3)
+    held, errors = [], []
+
+    def worker():
+        try:
+            for _ in range(20):
+                with pool.connection() as conn:
+                    # Вложенный вызов в том же потоке не берет второе соединение
+                    with pool.connection() as nested:
+                        assert nested is conn
+                    held.append(conn)
+                    conn.execute("SELECT 1")
+            with pool.connection() as conn:
+                barrier.wait(timeout=5)
+                held.append(conn)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert pool._created == 3
+    assert len({id(conn) for conn in held}) == 3
+    assert pool._idle.qsize() == 3
+    pool.close()
+    assert pool._created == 0
+
+
+def test_pool_times_out_when_exhausted(tmp_path):
+    import sqlite3
+    from database import ConnectionPool
+
+    pool = ConnectionPool(tmp_path / 'pool.db', max_size=1, timeout=0.05, pragmas={})
+    taken = threading.Event()
+    release = threading.Event()
+
+    def holder():
+        with pool.connection():
+            taken.set()
+            release.wait(timeout=5)
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    taken.wait(timeout=5)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            with pool.connection():
+                pass
+    finally:
+        release.set()
+        thread.join()
+    # Возвращенное соединение снова выдается
+    with pool.connection() as conn:
+        assert conn.execute("SELECT 1").fetchone()[0] == 1
+    pool.close()
+
+
+def test_async_wrappers_run_in_db_threads(db):
+    import asyncio
+    from database import AsyncDatabase
+
+    adb = AsyncDatabase(db, max_workers=2)
+
+    async def scenario():
+        assert await adb.add_nickname('Bob', 'chat')
+        counts = await adb.add_nicknames([('Eve', 'csv')])
+        assert counts['processed'] == 1 and counts['imported'] == 1
+        assert await adb.check_nickname('Bob')
+        assert (await adb.match_nickname('Bob'))['nickname'] == 'Bob'
+        page = await adb.get_nicknames_page(None, 1, True, 'next')
+        assert names(page) == ['Eve'] and page['next_cursor'] is not None
+        assert await adb.remove_nickname('Eve', False)
+        assert not await adb.check_nickname('Eve')
+        assert (await adb.get_detection_stats('Bob', 3))['days'] == 3
+        return await adb.run(threading.current_thread)
+
+    try:
+        assert asyncio.run(scenario()).name.startswith('db')
+    finally:
+        adb.close()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Массовый импорт и экспорт никнеймов (importer.py)"""
+
+import io
+import json
+
+import pytest
+
+
+@pytest.fixture
+def importer(db, monkeypatch):
+    """Модуль importer, работающий с БД из фикстуры db, а не с глобальной"""
+    import database
+
+    monkeypatch.setattr(database, 'db', db, raising=False)
+    import importer as module
+
+    monkeypatch.setattr(module, 'db', db)
+    return module
+
+
+def test_add_nicknames_counts_duplicates_as_skipped(db):
+    counts = db.add_nicknames([('alpha', 'import'), ('beta', None), ('alpha', 'import'), ('  ', None)],
+                              chunk_size=10)
+    assert counts == {'processed': 4, 'imported': 2, 'skipped': 2, 'failed': 0}
+    assert db.is_tracked('alpha') and db.is_tracked('beta')
+
+
+def test_csv_with_and_without_header(importer, db):
+    counts = importer.import_stream(io.StringIO('source,nickname\npartner,Alice\n,Bob\n'), 'csv', 'file')
+    assert counts == {'processed': 2, 'imported': 2, 'skipped': 0, 'failed': 0}
+    sources = {row['nickname']: row['source'] for row in db.iter_nicknames()}
+    assert sources == {'Alice': 'partner', 'Bob': 'file'}
+
+    counts = importer.import_stream(io.StringIO('Carol,extra\n\nDave\n'), 'csv')
+    assert counts['imported'] == 2 and db.is_tracked('Carol') and db.is_tracked('Dave')
+
+
+def test_ndjson_skips_malformed_lines(importer, db):
+    lines = ['"Alice"', '{"nickname": "Bob", "source": "chat"}', '{"name": "Eve"}', '{oops', '']
+    counts = importer.import_bytes(io.BytesIO('\n'.join(lines).encode('utf-8')), 'ndjson')
+    assert counts == {'processed': 4, 'imported': 2, 'skipped': 2, 'failed': 0}
+    assert not db.is_tracked('Eve')
+
+
+def test_export_round_trip(importer, db):
+    db.add_nicknames([('Вася', 'chat'), ('Bob', None)])
+    exported = ''.join(importer.export_lines('ndjson'))
+    assert [json.loads(line)['nickname'] for line in exported.splitlines()] == ['Bob', 'Вася']
+
+    rows = ''.join(importer.export_lines('csv')).splitlines()
+    assert rows[0] == ','.join(importer.EXPORT_COLUMNS) and len(rows) == 3
+    with pytest.raises(ValueError):
+        list(importer.export_lines('xml'))
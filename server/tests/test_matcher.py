@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Нечеткое сопоставление никнеймов (matcher.py)"""
+
+from matcher import FuzzyMatcher, damerau_levenshtein, normalize
+
+
+def test_normalize_folds_ocr_confusables():
+    assert normalize('  Pl4yer0ne ') == 'pl4yerone'
+    # Кириллические гомоглифы сводятся к латинице
+    assert normalize('Сатер') == normalize('Catep')
+
+
+def test_damerau_levenshtein_counts_transposition_as_one_edit():
+    assert damerau_levenshtein('abcd', 'abdc', 2) == 1
+    assert damerau_levenshtein('abcd', 'abcd', 2) == 0
+    assert damerau_levenshtein('abcd', 'wxyz', 1) == 2
+
+
+def test_exact_match_returns_original_spelling():
+    matcher = FuzzyMatcher(['ShadowHunter'], max_distance=1)
+    assert matcher.match('shadowhunter') == {'nickname': 'ShadowHunter', 'distance': 0}
+    assert matcher.match('Shad0wHunter') == {'nickname': 'ShadowHunter', 'distance': 0}
+
+
+def test_one_edit_within_limit():
+    matcher = FuzzyMatcher(['ShadowHunter', 'NightOwl'], max_distance=1)
+    assert matcher.match('ShadowHuntr') == {'nickname': 'ShadowHunter', 'distance': 1}
+    assert matcher.match('ShadwHuntr') is None
+
+
+def test_short_nicknames_match_strictly():
+    matcher = FuzzyMatcher(['abc'], max_distance=2)
+    assert matcher.match('abd') is None
+    assert matcher.match('ABC') == {'nickname': 'abc', 'distance': 0}
+    # Бюджет правок считается по короткому никнейму, а не по длинному запросу
+    assert matcher.match('abcd') is None
+    matcher = FuzzyMatcher(['Ann', 'Bob', 'Max'], max_distance=1)
+    assert [matcher.match(word) for word in ('Anna', 'Bobs', 'Maxi')] == [None, None, None]
+
+
+def test_remove_drops_nickname_from_fuzzy_index():
+    matcher = FuzzyMatcher(['ShadowHunter'], max_distance=1)
+    matcher.remove('ShadowHunter')
+    assert len(matcher) == 0
+    assert matcher.match('ShadowHuntr') is None
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Рассылка уведомлений: антиспам, сводки и лимит Bot API (notifier.py)"""
+
+import asyncio
+import threading
+import time
+
+from notifier import MAX_MESSAGE_LENGTH, NotificationDispatcher, TokenBucket, format_digest
+
+
+class FakeBot:
+    """Запоминает отправленные сообщения; может отвечать RetryAfter"""
+
+    def __init__(self, retry_after=()):
+        self.messages = []
+        self._retry_after = list(retry_after)
+
+    async def send_message(self, chat_id, text):
+        if self._retry_after:
+            error = RuntimeError('Flood control exceeded')
+            error.retry_after = self._retry_after.pop(0)
+            raise error
+        self.messages.append((chat_id, text))
+
+
+async def dispatch(bot, events, settle=0.1, **options):
+    """Запускает рассылку, передает события (nickname, source, пауза) и ждет отправки"""
+    options = {'cooldown': 60, 'digest_window': 0.05, 'rate_limit': 100, **options}
+    dispatcher = NotificationDispatcher(bot, chat_id=42, **options)
+    dispatcher.start()
+    for nickname, source, pause in events:
+        dispatcher.notify(nickname, source)
+        await asyncio.sleep(pause)
+    await asyncio.sleep(settle)
+    await dispatcher.stop()
+    return dispatcher
+
+
+def test_format_digest_single_and_grouped():
+    assert format_digest({'Bob': {'chat': 1}}) == ['🔔 Найден ник: Bob! [chat]']
+    assert format_digest({'Bob': {None: 1}, 'Eve': {'chat': 2, 'game': 1}}) == [
+        '🔔 Найдены ники:\n• Bob\n• Eve (×3) [chat, game]'
+    ]
+
+
+def test_format_digest_splits_long_messages():
+    pending = {f'player{i:04d}': {'chat': 1} for i in range(1000)}
+    messages = format_digest(pending)
+    assert len(messages) > 1
+    assert all(len(message) <= MAX_MESSAGE_LENGTH for message in messages)
+    assert sum(message.count('•') for message in messages) == 1000
+
+
+def test_events_within_window_are_sent_as_one_digest():
+    bot = FakeBot()
+    events = [('Bob', 'chat', 0), ('Eve', 'game', 0), ('Bob', 'game', 0)]
+    dispatcher = asyncio.run(dispatch(bot, events))
+    assert bot.messages == [(42, '🔔 Найдены ники:\n• Bob (×2) [chat, game]\n• Eve [game]')]
+    assert dispatcher.sent == 1
+
+
+def test_repeats_within_cooldown_are_suppressed():
+    bot = FakeBot()
+    events = [('Bob', 'chat', 0.1), ('Bob', 'chat', 0.1), ('Eve', 'chat', 0)]
+    dispatcher = asyncio.run(dispatch(bot, events))
+    assert [text for _, text in bot.messages] == [
+        '🔔 Найден ник: Bob! [chat]', '🔔 Найден ник: Eve! [chat]'
+    ]
+    assert dispatcher.suppressed == 1
+
+
+def test_cooldown_expires():
+    bot = FakeBot()
+    # Пауза намного больше антиспама и окна сводки: второе событие не попадает на границу
+    events = [('Bob', 'chat', 0.2), ('Bob', 'chat', 0)]
+    asyncio.run(dispatch(bot, events, cooldown=0.01, digest_window=0.01))
+    assert len(bot.messages) == 2
+
+
+def test_notify_from_another_thread():
+    bot = FakeBot()
+
+    async def scenario():
+        dispatcher = NotificationDispatcher(bot, chat_id=42, digest_window=0.01, rate_limit=100)
+        dispatcher.start()
+        thread = threading.Thread(target=dispatcher.notify, args=('Bob', 'chat'))
+        thread.start()
+        thread.join()
+        await asyncio.sleep(0.1)
+        await dispatcher.stop()
+
+    asyncio.run(scenario())
+    assert bot.messages == [(42, '🔔 Найден ник: Bob! [chat]')]
+
+
+def test_full_queue_drops_notifications():
+    async def scenario():
+        dispatcher = NotificationDispatcher(FakeBot(), chat_id=42, queue_size=2)
+        dispatcher.start()
+        # Задача рассылки еще не запускалась: очередь никто не разбирает
+        for nickname in ('a', 'b', 'c', 'd'):
+            dispatcher.notify(nickname)
+        await dispatcher.stop()
+        return dispatcher
+
+    assert asyncio.run(scenario()).dropped == 2
+
+
+def test_retry_after_is_honoured():
+    bot = FakeBot(retry_after=[0.05])
+    started = time.monotonic()
+    dispatcher = asyncio.run(dispatch(bot, [('Bob', None, 0)], settle=0.2))
+    assert bot.messages == [(42, '🔔 Найден ник: Bob!')]
+    assert dispatcher.sent == 1 and time.monotonic() - started >= 0.05
+
+
+def test_token_bucket_limits_rate():
+    async def acquire_all():
+        bucket = TokenBucket(rate=20, capacity=1)
+        started = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # Первый токен есть сразу, остальные три - по одному в 50 мс
+    assert 0.14 <= asyncio.run(acquire_all()) < 0.5
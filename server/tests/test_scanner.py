@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Поиск никнеймов в тексте кадра (scanner.py)"""
+
+import random
+
+from scanner import DELTA_LIMIT, Automaton, NicknameScanner
+
+
+def found(scanner, text):
+    return [(m['nickname'], m['start'], m['end']) for m in scanner.scan(text)]
+
+
+def brute_force(nicknames, text):
+    """Эталон: все вхождения без учета границ слов"""
+    hits = []
+    for nickname in nicknames:
+        start = text.find(nickname)
+        while start != -1:
+            hits.append((nickname, start, start + len(nickname)))
+            start = text.find(nickname, start + 1)
+    return sorted(hits, key=lambda hit: (hit[1], -hit[2]))
+
+
+def test_finds_overlapping_nicknames_in_one_pass():
+    scanner = NicknameScanner(['he', 'she', 'hers', 'his'], ignore_case=False, whole_words=False)
+    assert found(scanner, 'ushers') == [('she', 1, 4), ('hers', 2, 6), ('he', 2, 4)]
+
+
+def test_whole_words_skips_matches_inside_longer_words():
+    scanner = NicknameScanner(['Bob', 'Bob_1'], ignore_case=False, whole_words=True)
+    assert found(scanner, 'Bobby, Bob_1 и Bob.') == [('Bob_1', 7, 12), ('Bob', 15, 18)]
+
+
+def test_ignore_case_reports_stored_spelling():
+    scanner = NicknameScanner(['NightOwl'], ignore_case=True, whole_words=True)
+    assert found(scanner, 'nightowl: привет') == [('NightOwl', 0, 8)]
+    scanner = NicknameScanner(['NightOwl'], ignore_case=False, whole_words=True)
+    assert found(scanner, 'nightowl: привет') == []
+
+
+def test_automaton_matches_brute_force():
+    rng = random.Random(7)
+    words = sorted({''.join(rng.choice('abc') for _ in range(rng.randint(1, 4))) for _ in range(40)})
+    text = ''.join(rng.choice('abc ') for _ in range(300))
+    automaton = Automaton.build(words, ignore_case=False, whole_words=False)
+    hits = [(words[index], start, end) for index, start, end in automaton.scan(text)]
+    assert sorted(hits, key=lambda hit: (hit[1], -hit[2])) == brute_force(words, text)
+
+
+def test_add_and_remove_apply_before_rebuild():
+    scanner = NicknameScanner(['alpha', 'beta'], ignore_case=False, whole_words=True)
+    scanner.add('gamma')
+    scanner.remove('beta')
+    # Пока идет фоновая пересборка, изменения видны через дополнительный автомат
+    assert [hit[0] for hit in found(scanner, 'alpha beta gamma')] == ['alpha', 'gamma']
+    assert scanner.wait_rebuilt(timeout=10)
+    assert [hit[0] for hit in found(scanner, 'alpha beta gamma')] == ['alpha', 'gamma']
+    assert len(scanner) == 2
+
+
+def test_many_additions_found_before_and_after_rebuild(monkeypatch):
+    scanner = NicknameScanner([], ignore_case=False, whole_words=True)
+    # Фоновая пересборка откладывается, чтобы поиск шел только через дополнительные автоматы
+    monkeypatch.setattr(scanner, '_schedule_rebuild', lambda: None)
+    names = [f'player{i}' for i in range(2 * DELTA_LIMIT + 10)]
+    for name in names:
+        scanner.add(name)
+    assert [hit[0] for hit in found(scanner, f'{names[0]} {names[-1]}')] == [names[0], names[-1]]
+    scanner.add('late')
+    assert [hit[0] for hit in found(scanner, f'late {names[-1]}')] == ['late', names[-1]]
+
+    monkeypatch.undo()
+    scanner._schedule_rebuild()
+    assert scanner.wait_rebuilt(timeout=30)
+    assert [hit[0] for hit in found(scanner, f'{names[0]} {names[-1]}')] == [names[0], names[-1]]
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""Конвейер захват -> OCR -> сопоставление (screen_monitor.py)"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image, ImageDraw, ImageOps
+
+from config import config
+from scanner import NicknameScanner
+from screen_monitor import (DetectionSource, FrameProcessor, OcrPipeline, TesseractOcr,
+                            choose_lang, directory_frames, parse_regions, preprocess_line,
+                            region_sources, split_lines)
+
+
+class Watchlist:
+    """Список наблюдения в памяти с интерфейсом, нужным конвейеру"""
+
+    def __init__(self, nicknames):
+        self.scanner = NicknameScanner(nicknames, ignore_case=False, whole_words=True)
+
+    def get_charset(self):
+        return set()
+
+    def scan_text(self, text, source=None):
+        return self.scanner.scan(text)
+
+
+def frame(*widths):
+    """Кадр с полосами заданной длины (у правого края), по одной на строку"""
+    image = Image.new('L', (170, 20 * len(widths)), 255)
+    draw = ImageDraw.Draw(image)
+    for row, width in enumerate(widths):
+        draw.rectangle((170 - width, row * 20 + 4, 169, row * 20 + 15), fill=0)
+    return image
+
+
+def read_bar(line):
+    """Поддельный OCR: длина полосы в строке превращается в никнейм"""
+    left, _, right, _ = ImageOps.invert(line.convert('L')).getbbox()
+    return f'player{(right - left) // 10}'
+
+
+def test_unchanged_frame_skips_ocr_and_lines_are_cached():
+    calls = []
+    processor = FrameProcessor(ocr=lambda line: calls.append(line) or read_bar(line))
+    assert processor.process(frame(10, 20)) == ('player1\nplayer2', True)
+    assert processor.process(frame(10, 20)) == ('player1\nplayer2', False)
+    # Изменилась одна строка: вторая берется из кэша
+    assert processor.process(frame(10, 30)) == ('player1\nplayer3', True)
+    assert len(calls) == 3
+    assert processor.stats()['skipped_frames'] == 1
+
+
+def test_failed_frame_is_retried():
+    failures = [RuntimeError('tesseract')]
+
+    def flaky(line):
+        if failures:
+            raise failures.pop()
+        return read_bar(line)
+
+    processor = FrameProcessor(ocr=flaky)
+    with pytest.raises(RuntimeError):
+        processor.process(frame(10))
+    assert processor.process(frame(10)) == ('player1', True)
+
+
+def test_drop_oldest_keeps_latest_frames():
+    pipeline = OcrPipeline([DetectionSource('chat', iter(()))], ocr=read_bar, queue_size=2,
+                           executor=ThreadPoolExecutor(1), watchlist=Watchlist([]))
+    images = [frame(10 * (i + 1)) for i in range(5)]
+    for image in images:
+        pipeline._put_latest('chat', image)
+    assert pipeline.dropped == 3
+    assert list(pipeline._frames['chat']) == images[-2:]
+
+
+def test_in_flight_frames_are_bounded_and_emitted_in_order(tmp_path):
+    for i in range(12):
+        frame(10 * (i + 1)).save(tmp_path / f'{i:03d}.png')
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow(line):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return read_bar(line)
+
+    found = []
+    executor = ThreadPoolExecutor(8)
+    pipeline = OcrPipeline(
+        [DetectionSource('chat', directory_frames(tmp_path))],
+        ocr=slow, queue_size=100, executor=executor, max_in_flight=3,
+        watchlist=Watchlist([f'player{i}' for i in range(1, 13)]), on_match=found.append
+    )
+    pipeline.start().join()
+    executor.shutdown()
+
+    # Несколько кадров распознаются одновременно, но не больше max_in_flight
+    assert 1 < peak[0] <= 3
+    assert [m['nickname'] for m in found] == [f'player{i}' for i in range(1, 13)]
+    assert {m['source'] for m in found} == {'chat'}
+    assert pipeline.stats()['dropped'] == 0
+
+
+def test_split_lines_finds_text_bands_with_padding():
+    image = Image.new('L', (50, 60), 255)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 4, 20, 15), fill=0)
+    draw.rectangle((0, 44, 30, 55), fill=0)
+    assert split_lines(image) == [(3, 17), (43, 57)]
+    assert split_lines(Image.new('L', (50, 30), 255)) == []
+    # Полоса, упирающаяся в нижний край, тоже считается строкой
+    image = Image.new('L', (50, 10), 255)
+    ImageDraw.Draw(image).rectangle((0, 6, 20, 9), fill=0)
+    assert split_lines(image) == [(5, 10)]
+
+
+def test_preprocess_line_binarizes_light_text_on_dark_background():
+    line = Image.new('RGB', (120, 16), (20, 20, 40))
+    ImageDraw.Draw(line).rectangle((10, 4, 49, 11), fill=(230, 230, 200))
+
+    result = preprocess_line(line, target_height=32)
+    assert result.mode == 'L'
+    assert set(result.getdata()) <= {0, 255}
+    # Текст обрезан, отмасштабирован к высоте 32 и окружен белыми полями по 8 пикселей
+    assert result.height == 32 + 2 * 8
+    assert ImageOps.invert(result).getbbox() == (8, 8, result.width - 8, 40)
+    assert result.getpixel((0, 0)) == 255
+
+    blank = preprocess_line(Image.new('L', (40, 10), 0))
+    assert set(blank.getdata()) == {255}
+
+
+@pytest.mark.parametrize('charset, lang, expected', [
+    ({'a', 'b', '1'}, 'rus+eng', 'eng'),
+    ({'a', 'ж'}, 'rus+eng', 'rus+eng'),
+    ({'Ё'}, 'rus+eng', 'rus+eng'),
+    ({'a'}, 'rus', 'rus'),
+])
+def test_choose_lang_drops_rus_without_cyrillic(charset, lang, expected):
+    assert choose_lang(charset, lang) == expected
+
+
+def test_whitelist_built_from_watchlist_charset(monkeypatch):
+    monkeypatch.setitem(config.OCR, 'USE_WHITELIST', True)
+    monkeypatch.setitem(config.OCR, 'WHITELIST_EXTRA', ' _')
+    watchlist = Watchlist([])
+    watchlist.get_charset = lambda: {'b', 'a', 'ж'}
+
+    ocr = TesseractOcr.from_watchlist(watchlist)
+    assert ocr.whitelist == '_abж'
+    assert ocr.lang == choose_lang({'ж'})
+    assert "tessedit_char_whitelist='_abж'" in ocr.tesseract_config()
+
+    watchlist.get_charset = lambda: {'a', 'b'}
+    assert TesseractOcr.from_watchlist(watchlist).lang == 'eng'
+    monkeypatch.setitem(config.OCR, 'USE_WHITELIST', False)
+    assert TesseractOcr.from_watchlist(watchlist).whitelist == ''
+
+
+def test_pipeline_tags_matches_from_several_sources():
+    sources = [
+        DetectionSource('chat', iter([frame(10), frame(10, 20), frame(30)])),
+        DetectionSource('game', iter([frame(40), frame(50)])),
+        DetectionSource('lobby', iter([frame(10)])),
+    ]
+    found = []
+    executor = ThreadPoolExecutor(4)
+    pipeline = OcrPipeline(
+        sources, ocr=read_bar, queue_size=10, executor=executor,
+        watchlist=Watchlist([f'player{i}' for i in range(1, 6)]), on_match=found.append
+    )
+    pipeline.start().join()
+    executor.shutdown()
+
+    by_source = {}
+    for match in found:
+        by_source.setdefault(match['source'], []).append(match['nickname'])
+    # Внутри источника порядок кадров сохраняется, совпадения помечены своей областью
+    assert by_source == {
+        'chat': ['player1', 'player1', 'player2', 'player3'],
+        'game': ['player4', 'player5'],
+        'lobby': ['player1'],
+    }
+    assert pipeline.captured == {'chat': 3, 'game': 2, 'lobby': 1}
+    assert pipeline.stats()['dropped'] == 0
+
+
+def test_regions_are_parsed_from_config_with_clear_errors(monkeypatch):
+    monkeypatch.setitem(config.OCR, 'SCREEN_REGION', None)
+    monkeypatch.setitem(config.OCR, 'REGIONS', json.dumps({
+        'chat': {'region': [0, 600, 400, 300], 'interval': 0.5},
+        'game': {'region': [800, 0, 300, 80], 'psm': 6, 'preprocess': False},
+    }))
+    sources = region_sources()
+    assert [source.name for source in sources] == ['chat', 'game']
+    assert sources[0].ocr_options == {} and sources[1].ocr_options == {'psm': 6, 'preprocess': False}
+
+    monkeypatch.setitem(config.OCR, 'REGIONS', '')
+    assert region_sources() == []
+    monkeypatch.setitem(config.OCR, 'SCREEN_REGION', (1, 2, 3, 4))
+    assert [source.name for source in region_sources()] == ['screen']
+
+
+@pytest.mark.parametrize('value, message', [
+    ('{"chat": [0, 0', 'некорректный JSON'),
+    ('[[0, 0, 10, 10]]', 'ожидается объект'),
+    ('{"chat": {"region": [0, 0, 10]}}', "'chat'"),
+    ('{"chat": {"region": "0,0,10,10"}}', "'chat'"),
+    ('{"chat": {"region": [0, 0, 10, 10], "interval": 0}}', 'interval'),
+])
+def test_parse_regions_rejects_malformed_value(value, message):
+    with pytest.raises(ValueError, match=message):
+        parse_regions(value)
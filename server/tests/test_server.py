@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""HTTP API на Flask (server.py)"""
+
+import pytest
+
+from config import config
+
+HEADERS = {'X-API-KEY': config.API['KEYS'][0]}
+
+
+@pytest.fixture
+def client(global_db, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, 'db', global_db)
+    return server.app.test_client()
+
+
+def test_batch_check_reports_each_nickname(client, global_db):
+    global_db.add_nickname('Alice')
+    response = client.post('/api/check/batch', json={'nicknames': ['Alice', 'Bob']}, headers=HEADERS)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['results'] == {'Alice': True, 'Bob': False}
+    assert body['matches'] == ['Alice']
+
+
+@pytest.mark.parametrize('body', [['Alice'], 'Alice', 5, {}, {'nicknames': 'Alice'}, {'nicknames': [1]}])
+def test_batch_check_rejects_malformed_body(client, body):
+    response = client.post('/api/check/batch', json=body, headers=HEADERS)
+    assert response.status_code == 400
+
+
+def test_batch_check_limits(client, monkeypatch):
+    monkeypatch.setitem(config.API, 'MAX_BATCH_SIZE', 2)
+    response = client.post('/api/check/batch', json={'nicknames': ['a', 'b', 'c']}, headers=HEADERS)
+    assert response.status_code == 413
+    response = client.post('/api/check/batch', data='{oops', headers={**HEADERS, 'Content-Type': 'application/json'})
+    assert response.status_code == 400
+    assert client.post('/api/check/batch', json={'nicknames': []}).status_code == 401
+
+
+def test_scan_finds_nicknames_in_text(client, global_db):
+    global_db.add_nickname('Alice')
+    response = client.post('/api/scan', json={'text': 'Alice: hi\nBob: hey', 'source': 'chat'},
+                           headers=HEADERS)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['nicknames'] == ['Alice']
+    assert [(m['nickname'], m['start'], m['end']) for m in body['matches']] == [('Alice', 0, 5)]
+
+
+@pytest.mark.parametrize('body', [['text'], 'text', 5, {}, {'text': 5}, {'text': 'hi', 'source': 5}])
+def test_scan_rejects_malformed_body(client, body):
+    assert client.post('/api/scan', json=body, headers=HEADERS).status_code == 400
+
+
+def test_scan_limits_text_length(client, monkeypatch):
+    monkeypatch.setitem(config.API, 'MAX_SCAN_TEXT_LENGTH', 10)
+    assert client.post('/api/scan', json={'text': 'x' * 11}, headers=HEADERS).status_code == 413
+    assert client.post('/api/scan', json={'text': 'x' * 10}, headers=HEADERS).status_code == 200
+
+
+def test_add_validates_nickname_and_source(client, global_db):
+    for body in (['Alice'], {}, {'nickname': ''}, {'nickname': '   '}, {'nickname': 5},
+                 {'nickname': 'Alice', 'source': 5}, {'nickname': 'Alice', 'source': ['chat']}):
+        assert client.post('/api/add', json=body, headers=HEADERS).status_code == 400, body
+    assert not global_db.is_tracked('Alice')
+
+    response = client.post('/api/add', json={'nickname': ' Alice ', 'source': None}, headers=HEADERS)
+    assert response.status_code == 201
+    assert response.get_json() == {'status': 'success', 'nickname': 'Alice', 'source': 'manual'}
+    assert client.post('/api/add', json={'nickname': 'Alice'}, headers=HEADERS).status_code == 400
+
+
+def test_stats_rejects_invalid_days_and_limit(client, global_db):
+    global_db.add_nickname('Bob')
+    global_db.record_detections(['Bob'], 'chat')
+    global_db.flush_detections()
+    response = client.get('/api/stats?nickname=Bob&days=3', headers=HEADERS)
+    assert response.status_code == 200 and response.get_json()['total'] == 1
+
+    for query in ('nickname=Bob&days=abc', 'nickname=Bob&days=0', 'nickname=Bob&days=100000', 'days=3'):
+        assert client.get(f'/api/stats?{query}', headers=HEADERS).status_code == 400, query
+    assert client.get('/api/stats/top?days=abc', headers=HEADERS).status_code == 400
+    assert client.get('/api/stats/top?limit=abc', headers=HEADERS).status_code == 400
+    response = client.get('/api/stats/top?days=7&limit=5', headers=HEADERS)
+    assert [row['nickname'] for row in response.get_json()['nicknames']] == ['Bob']
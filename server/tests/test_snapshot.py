@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Двоичный формат снимка никнеймов (snapshot.py)"""
+
+import os
+import time
+
+import pytest
+
+from config import config
+from scanner import NicknameScanner
+from snapshot import (_HEADER, FLAG_WHOLE_WORDS, MAGIC, SnapshotWatchlist,
+                      WatchlistSnapshot, write_snapshot)
+
+NICKNAMES = ['Вася', 'zed', 'Alice', 'alice_2', 'Bob']
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = tmp_path / 'watchlist.bin'
+    write_snapshot(path, NICKNAMES, ignore_case=False, whole_words=True)
+    opened = WatchlistSnapshot(path)
+    yield opened
+    opened.close()
+
+
+def test_header_and_layout(tmp_path):
+    path = tmp_path / 'watchlist.bin'
+    result = write_snapshot(path, NICKNAMES + ['zed', ''], ignore_case=False, whole_words=True)
+    data = path.read_bytes()
+    assert result['bytes'] == len(data) and result['count'] == len(NICKNAMES)
+
+    magic, version, _, count, charset_len, blob_len, nodes, edges, flags = _HEADER.unpack_from(data)
+    assert magic == MAGIC and version == result['version']
+    assert count == len(NICKNAMES)
+    assert flags == FLAG_WHOLE_WORDS
+    # Никнеймы лежат в конце файла, отсортированными по байтам
+    blob = b''.join(sorted(name.encode('utf-8') for name in NICKNAMES))
+    assert blob_len == len(blob) and data.endswith(blob)
+    charset = data[len(data) - blob_len - charset_len:len(data) - blob_len].decode('utf-8')
+    assert set(charset) == set(''.join(NICKNAMES))
+    assert nodes > 0 and edges == nodes - 1
+
+
+def test_lookup_and_iteration(snapshot):
+    assert len(snapshot) == len(NICKNAMES)
+    assert list(snapshot) == sorted(NICKNAMES, key=lambda name: name.encode('utf-8'))
+    assert 'Вася' in snapshot and 'alice' not in snapshot and '' not in snapshot
+
+
+def test_scan_matches_in_memory_scanner(snapshot):
+    text = 'Alice, alice_2 и Вася; Bobby и zed'
+    scanner = NicknameScanner(NICKNAMES, ignore_case=False, whole_words=True)
+    assert snapshot.scan(text) == scanner.scan(text)
+
+
+def test_version_depends_on_content_and_flags(tmp_path):
+    first = write_snapshot(tmp_path / 'a.bin', NICKNAMES, ignore_case=False, whole_words=True)
+    same = write_snapshot(tmp_path / 'b.bin', reversed(NICKNAMES), ignore_case=False, whole_words=True)
+    flags = write_snapshot(tmp_path / 'c.bin', NICKNAMES, ignore_case=True, whole_words=True)
+    assert first['version'] == same['version'] != flags['version']
+
+
+def test_corrupted_file_is_rejected(tmp_path):
+    path = tmp_path / 'watchlist.bin'
+    write_snapshot(path, NICKNAMES)
+    with open(path, 'ab') as f:
+        f.write(b'x')
+    with pytest.raises(ValueError):
+        WatchlistSnapshot(path)
+    path.write_bytes(b'NOTASNAP' + path.read_bytes()[8:])
+    with pytest.raises(ValueError):
+        WatchlistSnapshot(path)
+
+
+def test_empty_snapshot(tmp_path):
+    path = tmp_path / 'watchlist.bin'
+    write_snapshot(path, [])
+    empty = WatchlistSnapshot(path)
+    assert len(empty) == 0 and empty.scan('anything') == [] and 'x' not in empty
+    empty.close()
+
+
+def test_watchlist_picks_up_replaced_file(tmp_path):
+    path = tmp_path / 'watchlist.bin'
+    write_snapshot(path, ['alpha'])
+    detected = []
+    watchlist = SnapshotWatchlist(path, refresh_interval=0,
+                                  on_detect=lambda names, source: detected.append((names, source)))
+    version = watchlist.watchlist_version
+    assert watchlist.is_tracked('alpha') and not watchlist.is_tracked('beta')
+
+    write_snapshot(path, ['alpha', 'beta'])
+    stat = path.stat()
+    # Гарантируем другой mtime даже на файловых системах с грубым временем
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert watchlist.is_tracked('beta')
+    assert watchlist.watchlist_version != version
+    assert [m['nickname'] for m in watchlist.scan_text('beta: hi', 'chat')] == ['beta']
+    assert detected == [(['beta'], 'chat')]
+
+
+def test_database_export_matches_active_watchlist(db, tmp_path):
+    for nickname in NICKNAMES:
+        db.add_nickname(nickname)
+    db.remove_nickname('zed')
+    result = db.export_snapshot(tmp_path / 'watchlist.bin')
+    assert result['count'] == len(NICKNAMES) - 1
+
+    watchlist = SnapshotWatchlist(tmp_path / 'watchlist.bin', refresh_interval=0)
+    assert watchlist.is_tracked('Вася') and not watchlist.is_tracked('zed')
+    assert watchlist.get_charset() == db.get_charset()
+
+
+def test_database_rewrites_snapshot_on_its_own_thread(db, tmp_path, monkeypatch):
+    path = tmp_path / 'watchlist.bin'
+    monkeypatch.setitem(config.DATABASE, 'SNAPSHOT_PATH', str(path))
+    monkeypatch.setitem(config.DATABASE, 'DETECTION_FLUSH_INTERVAL', 0.05)
+    db.add_nickname('alpha')
+    deadline = time.monotonic() + 10
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Снимок пишет свой поток, сброс обнаружений не запускался
+    assert db._snapshot_thread is not None and db._flush_thread is None
+    snapshot = WatchlistSnapshot(path)
+    assert 'alpha' in snapshot
+    snapshot.close()